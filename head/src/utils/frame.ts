@@ -0,0 +1,50 @@
+const MIME_TYPES: Record<string, string> = {
+  jpeg: "image/jpeg",
+  webp: "image/webp",
+};
+
+/**
+ * 把 canvas 当前画面编码为二进制（ArrayBuffer），用于 Socket.IO 二进制发送
+ */
+export function canvasToBuffer(
+  canvas: HTMLCanvasElement,
+  type = "image/jpeg",
+  quality = 0.8
+): Promise<ArrayBuffer | null> {
+  return new Promise((resolve) => {
+    canvas.toBlob(
+      (blob) => {
+        if (!blob) {
+          resolve(null);
+          return;
+        }
+        blob.arrayBuffer().then(resolve, () => resolve(null));
+      },
+      type,
+      quality
+    );
+  });
+}
+
+/**
+ * 把服务端返回的结果帧转为 <img> 可用的地址
+ * 二进制帧生成 object URL（并释放上一帧的 URL），字符串帧按 base64 处理
+ */
+export function createFrameUrlFactory() {
+  let lastUrl = "";
+  const toUrl = (image: ArrayBuffer | string, format = "jpeg"): string => {
+    const mime = MIME_TYPES[format] || MIME_TYPES.jpeg;
+    if (typeof image === "string") {
+      return image.startsWith("data:") ? image : `data:${mime};base64,${image}`;
+    }
+    const url = URL.createObjectURL(new Blob([image], { type: mime }));
+    if (lastUrl) URL.revokeObjectURL(lastUrl);
+    lastUrl = url;
+    return url;
+  };
+  const release = () => {
+    if (lastUrl) URL.revokeObjectURL(lastUrl);
+    lastUrl = "";
+  };
+  return { toUrl, release };
+}
@@ -14,8 +14,8 @@ import supervision as sv
 from datetime import datetime
 from dotenv import load_dotenv
 from PIL import Image
-from flask import Flask, request, jsonify, session
-from flask_socketio import SocketIO, emit
+from flask import Flask, request, jsonify, session, Response
+from flask_socketio import SocketIO, emit, join_room, leave_room
 from pprint import pprint
 
 # 设置日志输出
@@ -33,7 +33,24 @@ from rf_learning_utils import TrafficRLController
 # 导入交通指标可视化工具
 import traffic_metrics_utils as tmu
 # 导入交通信号灯分析工具
-from traffic_tl_utils_new import TrafficLightAnalyzer
+from traffic_tl_utils_new import get_analyzer
+from eva_log_index import get_log_index
+from chart_cache import chart_payloads
+from series_downsample import DOWNSAMPLE_METHODS
+from log_watcher import LogWatcher, CONGESTION_ROOM, intersection_room
+# 导入双模型共享推理引擎
+from inference_engine import InferenceEngine
+from device_utils import get_device
+# 导入实时流会话管理
+from stream_session import StreamSessionManager
+# 导入视频检测会话管理
+from video_session import VideoSessionManager
+# 导入视频预读
+from frame_reader import FrameReader
+# 导入多目标跟踪
+from tracking_utils import create_tracker, TrackHistoryStore
+# 导入帧编解码工具
+from frame_codec import decode_frame, to_payload, AdaptiveQuality, FrameEncoder
 
 #配置
 load_dotenv(override=True, dotenv_path='config/end-back.env')
@@ -42,6 +59,28 @@ HOST_NAME = os.environ['HOST_NAME']
 PORT = int(os.environ['PORT'])
 # 超时限制
 TOLERANT_TIME_ERROR = int(os.environ['TOLERANT_TIME_ERROR'])
+# 推理微批处理配置
+INFER_MAX_BATCH = int(os.environ.get('INFER_MAX_BATCH', 8))
+INFER_MAX_WAIT_MS = float(os.environ.get('INFER_MAX_WAIT_MS', 10))
+# 实时流会话空闲回收时间（秒）
+STREAM_IDLE_TIMEOUT = float(os.environ.get('STREAM_IDLE_TIMEOUT', 60))
+# 实时流背压：客户端最多未确认帧数 & 服务端每个客户端最多排队帧数
+STREAM_MAX_IN_FLIGHT = int(os.environ.get('STREAM_MAX_IN_FLIGHT', 2))
+STREAM_MAX_QUEUED = int(os.environ.get('STREAM_MAX_QUEUED', 1))
+# 同时进行的视频检测会话上限
+VIDEO_MAX_SESSIONS = int(os.environ.get('VIDEO_MAX_SESSIONS', 4))
+# 视频预读缓冲帧数
+VIDEO_PREFETCH_FRAMES = int(os.environ.get('VIDEO_PREFETCH_FRAMES', 8))
+# 结果帧编码配置
+FRAME_FORMAT = os.environ.get('FRAME_FORMAT', 'jpeg')
+FRAME_QUALITY = int(os.environ.get('FRAME_QUALITY', 90))
+FRAME_MIN_QUALITY = int(os.environ.get('FRAME_MIN_QUALITY', 50))
+FRAME_ADAPTIVE_QUALITY = os.environ.get('FRAME_ADAPTIVE_QUALITY', '1') == '1'
+FRAME_ENCODER_WORKERS = int(os.environ.get('FRAME_ENCODER_WORKERS', 2))
+# 图表接口每个系列默认最多返回的点数（0 为不降采样，可由请求参数 max_points 覆盖）
+CHART_MAX_POINTS = int(os.environ.get('CHART_MAX_POINTS', 500))
+# 训练日志推送的检查间隔（秒）
+LOG_WATCH_INTERVAL = float(os.environ.get('LOG_WATCH_INTERVAL', 2))
 # 获取当前文件夹的路径
 current_dir = os.getcwd()
 # 拼接文件夹路径
@@ -57,12 +96,23 @@ MYSQL_user = os.environ['MYSQL_user']
 MYSQL_password = os.environ['MYSQL_password']
 MYSQL_db = os.environ['MYSQL_db']
 MYSQL_charset = os.environ['MYSQL_charset']
+# 数据库连接池配置
+MYSQL_POOL_SIZE = int(os.environ.get('MYSQL_POOL_SIZE', 8))
+MYSQL_POOL_TIMEOUT = float(os.environ.get('MYSQL_POOL_TIMEOUT', 10))
+MYSQL_STATEMENT_TIMEOUT = int(os.environ.get('MYSQL_STATEMENT_TIMEOUT', 0))
 # 实例化数据库
 db = SQLManager(host=MYSQL_HOST, port=eval(MYSQL_PORT), user=MYSQL_user,
-				passwd=MYSQL_password, db=MYSQL_db, charset=MYSQL_charset)
+				passwd=MYSQL_password, db=MYSQL_db, charset=MYSQL_charset,
+				pool_size=MYSQL_POOL_SIZE, pool_timeout=MYSQL_POOL_TIMEOUT,
+				statement_timeout_ms=MYSQL_STATEMENT_TIMEOUT)
 
 # 加载模型
 model1, model2 = det_utils.load_models()
+# 启动共享推理引擎（摄像头、视频、图片请求共用，按时间窗口微批处理）
+inference_engine = InferenceEngine(model1, model2, max_batch_size=INFER_MAX_BATCH,
+                                   max_wait_ms=INFER_MAX_WAIT_MS).start()
+# 结果帧编码线程池（编码不占用推理线程）
+frame_encoder = FrameEncoder(max_workers=FRAME_ENCODER_WORKERS)
 
 box_annotator = sv.BoxAnnotator(
     thickness=2,
@@ -205,7 +255,8 @@ def recognize_photo():
 def yolo_res(before_img_path):
     try:
         # 处理静态图像（调用detection_utils中的函数）
-        annotated_frame, labels, traffic_stats = det_utils.process_static_image(before_img_path, model1, model2)
+        annotated_frame, labels, traffic_stats = det_utils.process_static_image(
+            before_img_path, model1, model2, engine=inference_engine)
         # 生成唯一的文件名
         timestamp = datetime.now().strftime('%Y-%m-%d-%H-%M-%S')
         random_suffix = ''.join(random.choice(string.ascii_lowercase) for i in range(5))
@@ -224,6 +275,15 @@ def yolo_res(before_img_path):
         pprint(str(e))
         return wrap_error_return_value('服务器繁忙，请稍后再试！')
 
+# 推理设备与单帧延迟统计
+@app.route('/inference_stats', methods=['GET'])
+def get_inference_stats():
+    return wrap_ok_return_value({
+        'device': get_device(),
+        'latency': inference_engine.latency.stats(),
+        'db_pool': db.pool_stats()
+    })
+
 # ws视频处理
 @app.route('/send_message', methods=['POST'])
 def send_message():
@@ -238,146 +298,219 @@ def send_message():
 @socketio.on('connect')
 def handle_connect():
     print(f'Client {request.sid} connected')
+    start_session_sweeper()
+    # 告知客户端流控窗口，客户端收到 frame_ack 后才继续发送
+    emit('flow_control', {'max_in_flight': STREAM_MAX_IN_FLIGHT})
 
 @socketio.on('disconnect')
 def handle_disconnect():
     print(f'Client {request.sid} disconnected')
-    global cap
-    if cap is not None:
-        cap.release()
-        cap = None
-is_video_stop = False
-is_video_pause = False
-last_video_path = ''
-cap = None
+    # 回收实时流会话
+    stream_sessions.remove(request.sid)
+    # 停止该客户端的视频检测会话（不影响其他客户端）
+    video_sessions.remove(request.sid)
+
+# 视频检测会话：每个客户端独立的 VideoCapture 与暂停/停止状态
+# 暂停/继续使用与 Socket.IO 异步模式一致的事件对象
+video_sessions = VideoSessionManager(max_sessions=VIDEO_MAX_SESSIONS,
+                                     event_factory=socketio.server.eio.create_event)
+
 @socketio.on('start_video_detection')
 def handle_start_video_detection(data):
-    # 全局变量
-    global last_video_path, is_video_pause, is_video_stop, cap
     if 'videoPath' not in data:
         emit('error', {'message': 'No video path provided'})
         return
     video_path = data['videoPath']
-    # 如果视频路径与 last_video_path 一样 并且是 暂停状态 则继续预测
-    if video_path == last_video_path and is_video_pause:
-        is_video_pause = False
+    # 同一视频再次请求时切换暂停/继续；视频变化时停止旧任务，重新开始预测
+    # 客户端声明支持二进制时，结果帧以二进制附件发送
+    session, status = video_sessions.start(request.sid, video_path, binary=bool(data.get('binary', False)))
+    if status == 'resumed':
         print('继续预测')
         return
-    # 如果视频路径与 last_video_path 一样 并且是 继续状态 则暂停预测
-    if video_path == last_video_path and not is_video_pause:
-        is_video_pause = True
+    if status == 'paused':
         print('暂停预测')
         return
-    # 如果视频路径与 last_video_path 不一样 （则释放视频，重新开始预测
-    if video_path!= last_video_path:
-        if cap is not None:
-            cap.release()
-        last_video_path = video_path
-        cap = cv2.VideoCapture(video_path)
-        socketio.start_background_task(process_video, request.sid)
+    if status == 'rejected':
+        emit('error', {'message': f'同时进行的视频检测已达上限（{VIDEO_MAX_SESSIONS}），请稍后再试'})
+        return
+    session.task = socketio.start_background_task(process_video, session)
+
+@socketio.on('stop_video_detection')
+def handle_stop_video_detection(data=None):
+    # 停止当前客户端的视频检测（暂停中的任务会被立即唤醒并退出）
+    if video_sessions.remove(request.sid) is not None:
+        print('停止预测')
+
+def emit_frame(event, sid, image, stats, binary=False, quality=FRAME_QUALITY, data_url=False, pending=None):
+    """
+    在编码线程池中编码结果帧并发送，返回本帧的编码任务
+    同一路流只保留一个未完成的编码任务，保证帧顺序并限制内存占用
+    """
+    if pending is not None:
+        try:
+            pending.result()
+        except Exception as e:
+            print(f"结果帧编码失败: {str(e)}")
+
+    def _send(data):
+        socketio.emit(event, {
+            'image': to_payload(data, FRAME_FORMAT, binary=binary, data_url=data_url),
+            'format': FRAME_FORMAT,
+            'stats': stats
+        }, room=sid)
+
+    return frame_encoder.submit(image, FRAME_FORMAT, quality, callback=_send)
 
-def process_video(sid):
-    global cap, is_video_pause
-    if not cap.isOpened():
+def process_video(session):
+    sid = session.sid
+    if not session.open():
         socketio.emit('error', {'message': 'Failed to open video file'}, room=sid)
+        video_sessions.finish(session)
         return
-    # 获取视频原始尺寸
-    original_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    original_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    # 每个视频会话独立的多目标跟踪器
+    tracker = create_tracker(frame_rate=session.cap.get(cv2.CAP_PROP_FPS) or 30)
+    # 后台线程预读解码，与推理并行
+    reader = FrameReader(session.cap, buffer_size=VIDEO_PREFETCH_FRAMES).start()
     # 加载车道坐标
-    lane_polygons = det_utils.load_lane_polygons()
+    lane_polygons = det_utils.get_lane_polygons()
     # 初始化统计数据
     stats = det_utils.init_stats(lane_polygons)
     vehicle_times = {}
-    vehicle_positions = {}
-    frame_count = 0
+    vehicle_positions = TrackHistoryStore()
+    pending_encode = None
     try:
-        while cap.isOpened():
-            if is_video_pause:
-                continue
-            ret, frame = cap.read()
-            if not ret:
+        while session.running:
+            # 暂停时阻塞等待继续或停止信号
+            if not session.wait_if_paused():
                 break
+            item = reader.read()
+            if item is None:
+                break
+            _, frame = item
 
             # 处理单帧图像（调用detection_utils中的函数）
             annotated_frame, vehicle_count, stats, lane_vehicle_count, lane_types_count = det_utils.process_image(
                 frame, model1, model2, lane_polygons, 
                 stats, vehicle_times, vehicle_positions, 
-                frame_count, include_stats_on_image=False
+                session.frame_count, include_stats_on_image=False, engine=inference_engine,
+                tracker=tracker
             )
 
-            # 编码并发送结果
-            encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), 90]
-            result, buffer = cv2.imencode('.jpg', annotated_frame, encode_param)
-            jpg_as_text = base64.b64encode(buffer).decode()
-
-            # 发送图像和统计数据
+            # 发送图像和统计数据（编码在编码线程池中完成）
             detection_stats = {
                 'total_vehicles': vehicle_count,
                 'lane_stats': lane_vehicle_count,
-                'lane_types': lane_types_count
+                'lane_types': lane_types_count,
+                'latency': inference_engine.latency.stats()
             }
 
-            socketio.emit('video_frame', {
-                'image': jpg_as_text, 
-                'stats': detection_stats
-            }, room=sid)
+            pending_encode = emit_frame('video_frame', sid, annotated_frame, detection_stats,
+                                        binary=session.binary, pending=pending_encode)
             
-            frame_count += 1
+            session.frame_count += 1
+            # 每帧让出调度，多个视频会话轮流向推理引擎提交
+            socketio.sleep(0)
             
     except Exception as e:
         socketio.emit('error', {'message': str(e)}, room=sid)
     finally:
-        cap.release()
+        # 先停止预读线程，再释放 VideoCapture
+        reader.stop()
+        video_sessions.finish(session)
 
 # ws摄像头camera处理
-# 全局变量
-real_time_frame_count = 0
+# 每个客户端一个会话：缓存车道坐标，跨帧保留统计与车辆轨迹
+stream_sessions = StreamSessionManager(idle_timeout=STREAM_IDLE_TIMEOUT,
+                                       max_queued=STREAM_MAX_QUEUED,
+                                       max_in_flight=STREAM_MAX_IN_FLIGHT)
+session_sweeper_started = False
+session_sweeper_lock = threading.Lock()
+
+def start_session_sweeper():
+    """启动空闲会话回收任务（只启动一次）"""
+    global session_sweeper_started
+    with session_sweeper_lock:
+        if session_sweeper_started:
+            return
+        session_sweeper_started = True
+    socketio.start_background_task(sweep_idle_sessions)
+
+def sweep_idle_sessions():
+    while True:
+        socketio.sleep(max(1.0, STREAM_IDLE_TIMEOUT / 2))
+        expired = stream_sessions.evict_idle()
+        if expired:
+            print(f'回收空闲实时流会话: {expired}')
 
 @socketio.on('frame')
 def handle_frame(data):
-    global real_time_frame_count
-    
     sid = request.sid
-    base64_image = data['imageData']
-    image = base64.b64decode(base64_image)
-    image = np.frombuffer(image, dtype=np.uint8)
-    image = cv2.imdecode(image, cv2.IMREAD_COLOR)
-    
-    # 加载车道坐标
-    lane_polygons = det_utils.load_lane_polygons()
+    # 获取当前客户端的会话
+    stream = stream_sessions.get(sid)
     
-    # 如果没有初始化统计数据，就初始化
-    stats = det_utils.init_stats(lane_polygons)
-    vehicle_times = {}
-    vehicle_positions = {}
+    # 客户端发送二进制帧时，结果也以二进制返回
+    image_data = data['imageData']
+    stream.binary = bool(data.get('binary', False)) or isinstance(image_data, (bytes, bytearray))
     
-    # 处理单帧图像（调用detection_utils中的函数）
-    annotated_frame, vehicle_count, stats, lane_vehicle_count, lane_types_count = det_utils.process_image(
-        image, model1, model2, lane_polygons, 
-        stats, vehicle_times, vehicle_positions, 
-        real_time_frame_count, include_stats_on_image=False
-    )
+    # 放入接收队列（只保留最新帧），处理任务未运行时启动
+    dropped, start_worker = stream.offer(image_data)
+    if dropped:
+        # 被挤掉的旧帧不会再有预测结果，立即归还发送额度
+        emit('frame_ack', dict(stream.flow_state(), status='dropped'))
+    if start_worker:
+        socketio.start_background_task(process_stream_frames, sid, stream)
+
+def process_stream_frames(sid, stream):
+    """逐帧处理某个客户端队列中的最新帧，直到队列为空"""
+    while True:
+        image_data = stream.take()
+        if image_data is None:
+            break
+        try:
+            process_stream_frame(sid, stream, image_data)
+        except Exception as e:
+            print(f"实时帧处理失败: {str(e)}")
+            socketio.emit('error', {'message': str(e)}, room=sid)
+        stream.mark_processed()
+        socketio.emit('frame_ack', dict(stream.flow_state(), status='done'), room=sid)
+
+def process_stream_frame(sid, stream, image_data):
+    # 支持二进制与 base64 两种输入
+    image = decode_frame(image_data)
     
-    # 编码并发送结果
-    encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), 90]
-    result, buffer = cv2.imencode('.jpg', annotated_frame, encode_param)
-    jpg_as_text = base64.b64encode(buffer).decode()
-    full_image_data = f"data:image/jpeg;base64,{jpg_as_text}"
+    with stream.lock:
+        # 车道坐标文件修改后才重新加载
+        lane_polygons = stream.refresh_lanes()
+        
+        # 处理单帧图像（调用detection_utils中的函数）
+        annotated_frame, vehicle_count, stats, lane_vehicle_count, lane_types_count = det_utils.process_image(
+            image, model1, model2, lane_polygons, 
+            stream.stats, stream.vehicle_times, stream.vehicle_positions, 
+            stream.frame_count, include_stats_on_image=False, engine=inference_engine,
+            tracker=stream.tracker
+        )
+        stream.frame_count += 1
+        # 清理过期车辆轨迹
+        stream.prune_history()
     
     # 发送图像和统计数据
     detection_stats = {
         'total_vehicles': vehicle_count,
         'lane_stats': lane_vehicle_count,
-        'lane_types': lane_types_count
+        'lane_types': lane_types_count,
+        'latency': inference_engine.latency.stats(),
+        'dropped_frames': stream.dropped
     }
     
-    emit('prediction', {
-        'image': full_image_data, 
-        'stats': detection_stats
-    }, room=sid)
+    # 根据丢帧情况自适应编码质量
+    if stream.quality is None:
+        stream.quality = AdaptiveQuality(FRAME_QUALITY, FRAME_MIN_QUALITY, enabled=FRAME_ADAPTIVE_QUALITY)
+    quality = stream.quality.update(stream.dropped)
     
-    real_time_frame_count += 1
+    # 编码在编码线程池中完成，推理线程继续处理下一帧
+    stream.pending_encode = emit_frame('prediction', sid, annotated_frame, detection_stats,
+                                       binary=stream.binary, quality=quality, data_url=True,
+                                       pending=stream.pending_encode)
 
 # 添加WebSocket事件，用于RL输出
 @socketio.on('start_rl_processing')
@@ -690,10 +823,12 @@ def map_point_click():
         data = request.json
         index = data.get('index')
         print(f"收到地图点击事件，点击的索引为: {index}")
+        # 图表缩放窗口与降采样参数
+        chart_view = chart_view_params(data)
         
         # 获取训练指标数据
         try:
-            training_metrics = tmu.get_training_metrics_data()
+            training_metrics = tmu.get_training_metrics_data(**chart_view)
             print(f"成功获取训练指标数据")
         except Exception as e:
             print(f"获取训练指标数据出错: {str(e)}")
@@ -713,7 +848,7 @@ def map_point_click():
             try:
                 # 获取路口数据
                 try:
-                    intersection_data = tmu.get_intersection_data(index)
+                    intersection_data = tmu.get_intersection_data(index, **chart_view)
                     print(f"成功获取路口 {index} 数据")
                     
                     # 单独提取改善数据
@@ -726,73 +861,8 @@ def map_point_click():
                             log_file = os.path.join(current_dir, 'data', 'model_eva.log')
 
                             if os.path.exists(log_file):
-                                # 导入traffic_metrics_utils中的函数进行直接计算
-                                from traffic_metrics_utils import calculate_improvement, softplus_transform
-                                
-                                # 重新计算改善数据
-                                pattern = re.compile(
-                                    r"Test step:\d+/\d+,\s*travel time\s*:\s*([\d\.]+),.*?queue:\s*([\d\.]+),\s*delay:\s*([\d\.]+),\s*throughput:\s*(\d+)"
-                                )
-                                
-                                # 分配权重
-                                w1 = {'speed':0.1, 'flow':0.1, 'low_delay':0.6, 'throughput':0.2}
-                                w2 = {'low_delay':0.50, 'total_delay':0.50}
-                                
-                                with open(log_file, 'r', encoding='utf-8') as f:
-                                    lines = f.readlines()
-                                    
-                                prev = {'tt':None, 'q':None, 'd':None, 'tp':None}
-                                results = []
-                                
-                                for line in lines:
-                                    m = pattern.search(line)
-                                    if not m:
-                                        continue
-                                        
-                                    curr = {
-                                        'tt': float(m.group(1)),
-                                        'q': float(m.group(2)),
-                                        'd': float(m.group(3)),
-                                        'tp': int(m.group(4))
-                                    }
-                                    
-                                    if prev['tt'] is not None:
-
-                                        prev_speed = 1/prev['tt'] if prev['tt']>0 else 0
-                                        curr_speed = 1/curr['tt'] if curr['tt']>0 else 0
-                                        prev_flow = 1/prev['q'] if prev['q']>0 else 0
-                                        curr_flow = 1/curr['q'] if curr['q']>0 else 0
-                                        prev_ld = 1/prev['d'] if prev['d']>0 else 0
-                                        curr_ld = 1/curr['d'] if curr['d']>0 else 0
-                                        
-
-                                        imp = {
-                                            'speed': calculate_improvement(prev_speed, curr_speed, False),
-                                            'flow': calculate_improvement(prev_flow, curr_flow, False),
-                                            'low_delay': calculate_improvement(prev_ld, curr_ld, False),
-                                            'throughput': calculate_improvement(prev['tp'], curr['tp'], False),
-                                        }
-                                        
-
-                                        prev_td = prev['q'] * prev['d']
-                                        curr_td = curr['q'] * curr['d']
-                                        imp['total_delay'] = calculate_improvement(prev_td, curr_td, True)
-                                        
-
-                                        raw_old = sum(imp[k] * w1[k] for k in w1)
-                                        raw_new = sum(imp[k] * w2[k] for k in w2)
-                                        
-
-                                        old_overall = softplus_transform(raw_old, beta=2.0, offset=0.0)
-                                        new_overall = softplus_transform(raw_new, beta=2.0, offset=0.0)
-                                        
-
-                                        results.append({
-                                            'congestion_decrease': old_overall,
-                                            'delay_decrease': new_overall
-                                        })
-                                    
-                                    prev = curr
+                                # 从共享的日志索引计算全部改善数据，用于前端循环显示
+                                results = tmu.get_traffic_improvement_series(log_file, beta=2.0, offset=0.0)
 
                                 # 如果有结果，使用最新的作为当前显示值
                                 if results:
@@ -819,8 +889,8 @@ def map_point_click():
                         print(f"错误：信号灯配置文件或日志文件不存在")
                         traffic_light_data = {"error": "信号灯数据不可用：配置文件不存在"}
                     else:
-                        # 创建分析器并获取信号灯数据
-                        analyzer = TrafficLightAnalyzer(net_file, log_file)
+                        # 获取共享的分析器（文件未修改时不重新解析）并获取信号灯数据
+                        analyzer = get_analyzer(net_file, log_file)
                         traffic_light_data = analyzer.get_intersection_light_data(int(index))
                         print(f"成功获取路口 {index} 信号灯数据")
 
@@ -906,26 +976,58 @@ def verify_echarts_data(data):
         if 'type' not in series:
             series['type'] = 'line'
 
+def chart_view_params(params):
+    """
+    从请求参数中读取图表视图设置
+    max_points: 每个系列最多返回的点数（默认 CHART_MAX_POINTS，0 为不降采样）
+    start / end: 缩放窗口（序号，左闭右开）；method: lttb | minmax
+    """
+    def to_int(name, default=None):
+        try:
+            value = params.get(name)
+            return default if value is None or value == '' else int(value)
+        except (TypeError, ValueError):
+            return default
+
+    max_points = to_int('max_points', CHART_MAX_POINTS)
+    method = params.get('method') or 'lttb'
+    return {
+        'max_points': max_points if max_points and max_points > 0 else None,
+        'start': to_int('start'),
+        'end': to_int('end'),
+        'method': method if method in DOWNSAMPLE_METHODS else 'lttb',
+    }
+
 @app.route('/get_all_charts_data', methods=['GET'])
 def get_all_charts_data():
-    """获取所有图表数据的API端点，包括训练指标和所有路口数据"""
+    """
+    获取所有图表数据的API端点，包括训练指标和所有路口数据
+    响应按日志版本缓存为序列化好的字节：支持 ETag / If-None-Match（数据未变返回 304）、
+    gzip 压缩，以及缩放窗口与降采样参数（见 chart_view_params）
+    """
     try:
-        # 获取所有图表数据
-        all_data = tmu.get_all_metrics_data()
-        print("成功获取所有图表数据")
-        
-        return wrap_ok_return_value(all_data)
+        payload = chart_payloads.get(**chart_view_params(request.args))
+
+        # 按 q 值判断（gzip;q=0 表示不接受）
+        use_gzip = request.accept_encodings['gzip'] > 0
+        etag = payload.gzip_etag if use_gzip else payload.etag
+
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+        elif use_gzip:
+            response = Response(payload.gzip_body, mimetype='application/json')
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            response = Response(payload.body, mimetype='application/json')
+        response.set_etag(etag)
+        # 每次都向服务端确认，数据未变时只返回 304
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['Vary'] = 'Accept-Encoding'
+        return response
     except Exception as e:
         print(f"获取所有图表数据失败: {str(e)}")
         return wrap_error_return_value(f'获取图表数据失败: {str(e)}')
 
-# 添加全局缓存
-_log_cache = {
-    "episodes": None,
-    "last_modified": 0,
-    "log_path": "./data/model_eva.log"
-}
-
 @app.route("/api/congestion", methods=["GET"])
 def get_congestion():
     """支持按episode索引请求数据"""
@@ -972,13 +1074,11 @@ def parse_log(log_path=None):
     """
     按episode分组解析日志文件
     返回格式: [[{id,mean_queue}], ...] (每个列表元素为一个episode的16个路口数据)
-    使用缓存避免重复解析
+    数据来自共享的日志索引，只解析新追加的内容
     """
-    global _log_cache
-    
     if log_path is None:
-        log_path = _log_cache["log_path"]
-    
+        log_path = os.path.join('data', 'model_eva.log')
+
     # 确保日志文件路径是绝对路径
     if not os.path.isabs(log_path):
         log_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), log_path)
@@ -989,52 +1089,51 @@ def parse_log(log_path=None):
             print(f"警告: 日志文件不存在 {log_path}")
             # 返回空数据，而不是模拟数据
             return []
-        
-        # 获取文件最后修改时间
-        file_modified_time = os.path.getmtime(log_path)
-        
-        # 检查缓存是否有效
-        if (_log_cache["episodes"] is not None and 
-            _log_cache["last_modified"] >= file_modified_time):
-            return _log_cache["episodes"]
-        
-        # 缓存无效，需要重新解析
-        print(f"重新解析日志文件: {log_path}")
-        
-        episodes = []
-        current_episode = []
-        
-        with open(log_path, "r", encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                # 检测新episode开始
-                if line.startswith("episode:"):
-                    if current_episode:  # 保存上一个episode
-                        episodes.append(current_episode)
-                        current_episode = []
-                # 提取路口数据
-                elif line.startswith("intersection:"):
-                    match = re.search(r"intersection:(\d+).*mean_queue:([\d.]+)", line)
-                    if match:
-                        id = int(match.group(1))
-                        mean_queue = float(match.group(2))
-                        current_episode.append({"id": id, "mean_queue": mean_queue})
-            # 添加最后一个episode
-            if current_episode:
-                episodes.append(current_episode)
-        
-        # 更新缓存
-        _log_cache["episodes"] = episodes
-        _log_cache["last_modified"] = file_modified_time
-        _log_cache["log_path"] = log_path
-        
-        print(f"成功解析日志文件，共{len(episodes)}个episode，每个包含{len(episodes[0]) if episodes else 0}个路口数据")
-        return episodes
+
+        return get_log_index(log_path).episodes()
     except Exception as e:
         print(f"日志解析失败: {str(e)}")
         # 出错时返回空数据
         return []
 
+# 训练日志推送：一个后台任务检查日志，增量广播给订阅的看板
+log_watcher = LogWatcher(socketio,
+                         eva_log_file=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'model_eva.log'),
+                         net_file=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'hangzhou_net.xml'),
+                         tl_log_file=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'tl.log'),
+                         interval=LOG_WATCH_INTERVAL)
+
+@socketio.on('subscribe_congestion')
+def handle_subscribe_congestion():
+    """订阅拥堵数据：先发送全部 episode，之后推送新的 episode"""
+    join_room(CONGESTION_ROOM)
+    log_watcher.ensure_started()
+    emit('congestion_snapshot', log_watcher.snapshot())
+
+@socketio.on('unsubscribe_congestion')
+def handle_unsubscribe_congestion():
+    leave_room(CONGESTION_ROOM)
+
+@socketio.on('subscribe_intersection')
+def handle_subscribe_intersection(data):
+    """订阅路口增量数据，previous 为之前订阅的路口（一并退订）"""
+    data = data or {}
+    try:
+        if data.get('previous') is not None:
+            leave_room(intersection_room(data['previous']))
+        join_room(intersection_room(data['index']))
+    except (KeyError, TypeError, ValueError):
+        emit('intersection_update', {'error': '无效的路口ID'})
+        return
+    log_watcher.ensure_started()
+
+@socketio.on('unsubscribe_intersection')
+def handle_unsubscribe_intersection(data):
+    try:
+        leave_room(intersection_room((data or {})['index']))
+    except (KeyError, TypeError, ValueError):
+        pass
+
 # 添加心跳机制，保持连接活跃
 @socketio.on('heartbeat')
 def handle_heartbeat():
@@ -0,0 +1,71 @@
+import gzip
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+import traffic_metrics_utils as tmu
+
+# 压缩级别：图表数据为重复度很高的数字文本，6 级已接近最优
+GZIP_LEVEL = 6
+
+
+class ChartPayload:
+    """预先序列化好的图表响应：JSON 字节、gzip 字节与各自的 ETag"""
+
+    def __init__(self, data):
+        self.body = json.dumps({
+            'code': 200,
+            'msg': '执行成功！',
+            'data': data
+        }).encode('utf-8')
+        self.gzip_body = gzip.compress(self.body, compresslevel=GZIP_LEVEL)
+        # 不带引号的 ETag 值，写入响应头时由 Flask 加引号
+        # 不同内容编码是不同的表示，不能共用强 ETag，gzip 响应单独加后缀
+        self.etag = hashlib.sha1(self.body).hexdigest()
+        self.gzip_etag = self.etag + '-gz'
+
+
+class ChartPayloadCache:
+    """
+    /get_all_charts_data 的响应缓存
+    按 (日志版本, 视图参数) 缓存序列化结果，日志有新内容时整体失效；
+    视图参数为缩放窗口与降采样设置，每个版本最多缓存 max_views 种；
+    生成出错时返回空图表但不缓存，下次请求重新生成
+    """
+
+    def __init__(self, max_views=32):
+        self.max_views = max_views
+        self._version = None
+        self._payloads = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, max_points=None, start=None, end=None, method='lttb'):
+        view = {'max_points': max_points, 'start': start, 'end': end, 'method': method}
+        key = (max_points, start, end, method)
+        version = tmu.get_metrics_version()
+        # 演示数据或版本未知时不缓存
+        if version is None:
+            return ChartPayload(tmu.get_all_metrics_data(**view))
+
+        with self._lock:
+            if version != self._version:
+                self._version = version
+                self._payloads.clear()
+            payload = self._payloads.get(key)
+            if payload is not None:
+                self._payloads.move_to_end(key)
+                return payload
+            try:
+                payload = ChartPayload(tmu.build_all_metrics_data(**view))
+            except Exception as e:
+                print(f"生成图表数据失败: {str(e)}")
+                return ChartPayload(tmu.empty_metrics_data())
+            self._payloads[key] = payload
+            while len(self._payloads) > self.max_views:
+                self._payloads.popitem(last=False)
+            return payload
+
+
+# 进程内共享的图表响应缓存
+chart_payloads = ChartPayloadCache()
@@ -1,5 +1,9 @@
 
 import string
+import time
+import queue
+import threading
+from contextlib import contextmanager
 from pprint import pprint
 import pymysql
 
@@ -13,14 +17,18 @@ import pymysql
 # }
 
 class SQLManager(object):
+	"""
+	带连接池的数据库管理类（线程安全）
+	每次操作从连接池取出一个连接，用完归还；连接空闲较久时先 ping，断开自动重连
+	"""
 
 	# 初始化实例方法
 	def __init__(self,
 				 host:str="127.0.0.1", port:int=3306, user:str="root",
-				 passwd:str="123456", db:str="yolo", charset:str="utf8"):
-		self.conn = None
-		self.cursor = None
-
+				 passwd:str="123456", db:str="yolo", charset:str="utf8",
+				 pool_size:int=8, pool_timeout:float=10.0, connect_timeout:int=5,
+				 read_timeout:int=30, write_timeout:int=30,
+				 statement_timeout_ms:int=0, ping_interval:float=60.0):
 		# 数据库配置
 		self.host = host
 		self.port = port
@@ -29,57 +37,210 @@ class SQLManager(object):
 		self.db = db
 		self.charset = charset
 
-		# 连接数据库
+		# 连接池配置：最大连接数、取连接最长等待时间、超时设置
+		self.pool_size = max(1, int(pool_size))
+		self.pool_timeout = pool_timeout
+		self.connect_timeout = connect_timeout
+		self.read_timeout = read_timeout
+		self.write_timeout = write_timeout
+		# 单条查询的最长执行时间（毫秒，0 表示不限制）
+		self.statement_timeout_ms = int(statement_timeout_ms)
+		# 连接空闲超过该时长（秒），使用前先 ping
+		self.ping_interval = ping_interval
+
+		# 空闲连接（后进先出，优先复用刚用过的连接），元素为 (连接, 上次使用时间)
+		self._pool = queue.LifoQueue(maxsize=self.pool_size)
+		self._created = 0
+		self._lock = threading.Lock()
+
+		# 连接池等待统计
+		self._wait_count = 0
+		self._wait_total = 0.0
+		self._wait_max = 0.0
+		self._timeouts = 0
+
+		# 连接数据库（启动时建立一个连接，配置错误可以尽早发现）
 		self.connect()
 
 	# 连接数据库
 	def connect(self):
-		self.conn = pymysql.connect(
+		with self._lock:
+			self._created += 1
+		try:
+			conn = self._create_connection()
+		except Exception:
+			with self._lock:
+				self._created -= 1
+			raise
+		self._release(conn)
+
+	# 新建一个数据库连接
+	def _create_connection(self):
+		init_command = None
+		if self.statement_timeout_ms > 0:
+			# MySQL 5.7.8+：超过时间的 SELECT 语句会被服务端中止
+			init_command = f"SET SESSION MAX_EXECUTION_TIME={self.statement_timeout_ms}"
+		return pymysql.connect(
 			host=self.host,
 			port=self.port,
 			user=self.user,
 			passwd=self.passwd,
 			db=self.db,
-			charset=self.charset
+			charset=self.charset,
+			connect_timeout=self.connect_timeout,
+			read_timeout=self.read_timeout,
+			write_timeout=self.write_timeout,
+			init_command=init_command
 		)
-		self.cursor = self.conn.cursor(cursor=pymysql.cursors.DictCursor)
+
+	# 从连接池取出一个连接（池空且未达上限时新建，否则等待）
+	def _acquire(self):
+		start = time.perf_counter()
+		try:
+			conn, last_used = self._pool.get_nowait()
+		except queue.Empty:
+			with self._lock:
+				can_create = self._created < self.pool_size
+				if can_create:
+					self._created += 1
+			if can_create:
+				try:
+					conn, last_used = self._create_connection(), time.time()
+				except Exception:
+					with self._lock:
+						self._created -= 1
+					raise
+			else:
+				try:
+					conn, last_used = self._pool.get(timeout=self.pool_timeout)
+				except queue.Empty:
+					with self._lock:
+						self._timeouts += 1
+					raise TimeoutError(f"等待数据库连接超时（{self.pool_timeout}秒）")
+		self._record_wait(time.perf_counter() - start)
+
+		# 空闲较久的连接可能已被 MySQL 断开（wait_timeout），使用前 ping，断开时自动重连
+		if time.time() - last_used > self.ping_interval:
+			try:
+				conn.ping(reconnect=True)
+			except Exception:
+				self._discard(conn)
+				raise
+		return conn
+
+	# 归还连接
+	def _release(self, conn):
+		try:
+			self._pool.put_nowait((conn, time.time()))
+		except queue.Full:
+			self._discard(conn)
+
+	# 丢弃连接（出错或池已满）
+	def _discard(self, conn):
+		with self._lock:
+			self._created -= 1
+		try:
+			conn.close()
+		except Exception:
+			pass
+
+	# 记录取连接的等待时间
+	def _record_wait(self, seconds):
+		with self._lock:
+			self._wait_count += 1
+			self._wait_total += seconds
+			self._wait_max = max(self._wait_max, seconds)
+
+	# 取出连接执行操作，完成后归还；连接异常时丢弃
+	@contextmanager
+	def connection(self):
+		conn = self._acquire()
+		try:
+			yield conn
+		except (pymysql.err.OperationalError, pymysql.err.InterfaceError):
+			# 连接已不可用，不再放回连接池
+			self._discard(conn)
+			raise
+		except Exception:
+			try:
+				conn.rollback()
+			except Exception:
+				self._discard(conn)
+				raise
+			self._release(conn)
+			raise
+		else:
+			self._release(conn)
+
+	# 每次操作使用独立的 cursor，避免多线程共享
+	@contextmanager
+	def _cursor(self):
+		with self.connection() as conn:
+			with conn.cursor(cursor=pymysql.cursors.DictCursor) as cursor:
+				yield conn, cursor
 
 	# 查询多条数据
 	def get_list(self, sql, args=None)->list:
-		self.cursor.execute(sql, args)
-		result = self.cursor.fetchall()
+		with self._cursor() as (conn, cursor):
+			cursor.execute(sql, args)
+			result = cursor.fetchall()
+			conn.commit()
 		return result
 
 	# 查询单条数据
 	def get_one(self, sql, args=None) ->dict:
-		self.cursor.execute(sql, args)
-		result = self.cursor.fetchone()
+		with self._cursor() as (conn, cursor):
+			cursor.execute(sql, args)
+			result = cursor.fetchone()
+			conn.commit()
 		return result
 
 	# 执行单条SQL语句
 	def modify(self, sql, args=None):
-		self.cursor.execute(sql, args)
-		self.conn.commit()
+		with self._cursor() as (conn, cursor):
+			cursor.execute(sql, args)
+			conn.commit()
 
 	# 我如果要批量执行多个创建操作，虽然只建立了一次数据库连接但是还是会多次提交，可不可以改成一次连接，一次提交呢？
 	# 可以，只需要用上pymysql的executemany()方法就可以了。
 
 	# 执行多条SQL语句
 	def multi_modify(self, sql, args=None):
-		self.cursor.executemany(sql, args)
-		self.conn.commit()
+		with self._cursor() as (conn, cursor):
+			cursor.executemany(sql, args)
+			conn.commit()
 
 	# 创建单条记录的语句
 	def create(self, sql, args=None):
-		self.cursor.execute(sql, args)
-		self.conn.commit()
-		last_id = self.cursor.lastrowid
+		with self._cursor() as (conn, cursor):
+			cursor.execute(sql, args)
+			conn.commit()
+			last_id = cursor.lastrowid
 		return last_id
 
-	# 关闭数据库cursor和连接
+	# 连接池状态
+	def pool_stats(self) -> dict:
+		with self._lock:
+			wait_count = self._wait_count
+			return {
+				'size': self.pool_size,
+				'created': self._created,
+				'idle': self._pool.qsize(),
+				'in_use': self._created - self._pool.qsize(),
+				'waits': wait_count,
+				'wait_avg_ms': round(self._wait_total * 1000.0 / wait_count, 2) if wait_count else 0.0,
+				'wait_max_ms': round(self._wait_max * 1000.0, 2),
+				'timeouts': self._timeouts
+			}
+
+	# 关闭连接池中的所有空闲连接
 	def close(self):
-		self.cursor.close()
-		self.conn.close()
+		while True:
+			try:
+				conn, _ = self._pool.get_nowait()
+			except queue.Empty:
+				break
+			self._discard(conn)
 
 	# 最后，我们每次操作完数据库之后都要手动关闭，可不可以写成自动关闭的呢？
 	# 联想到我们之前学过的文件操作，使用with语句可以实现缩进结束自动关闭文件句柄的例子。
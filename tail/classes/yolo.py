@@ -25,6 +25,7 @@ import cv2
 
 from classes.paint_trail import draw_trail
 from utils.main_utils import check_path
+from frame_reader import FrameReader
 
 x_axis_time_graph = []
 y_axis_count_graph = []
@@ -90,6 +91,7 @@ class YoloPredictor(BasePredictor, QObject):
         self.class_num = None
         self.total_frames = None
         self.lock_id = None
+        self.frame_reader = None  # 本地视频的预读器
 
         # 设置线条样式    厚度 & 缩放大小
         self.box_annotator = sv.BoxAnnotator(
@@ -131,8 +133,13 @@ class YoloPredictor(BasePredictor, QObject):
                            view_img=True)
 
         # 获取数据源 （不同的类型获取不同的数据源）
-        iter_model = iter(
-            model.track(source=self.source, show=False, stream=True, iou=self.iou_thres, conf=self.conf_thres))
+        if self.is_video_file(self.source):
+            # 本地视频：后台线程预读解码，与检测并行
+            self.frame_reader = FrameReader(self.source).start()
+            iter_model = self.track_frames(model, self.frame_reader)
+        else:
+            iter_model = iter(
+                model.track(source=self.source, show=False, stream=True, iou=self.iou_thres, conf=self.conf_thres))
 
 
 
@@ -143,11 +150,9 @@ class YoloPredictor(BasePredictor, QObject):
 
         self.yolo2main_status_msg.emit('检测中...')
 
-        # 使用OpenCV读取视频——获取进度条
-        if 'mp4' in self.source or 'avi' in self.source or 'mkv' in self.source or 'flv' in self.source or 'mov' in self.source:
-            cap = cv2.VideoCapture(self.source)
-            self.total_frames = cap.get(cv2.CAP_PROP_FRAME_COUNT)
-            cap.release()
+        # 获取视频总帧数——进度条
+        if self.frame_reader is not None:
+            self.total_frames = self.frame_reader.frame_count
 
         # 如果保存，则创建写入对象
         img_res, result, height, width = self.recognize_res(iter_model)
@@ -195,6 +200,21 @@ class YoloPredictor(BasePredictor, QObject):
             out.release()
         except:
             pass
+        # 停止预读线程
+        if self.frame_reader is not None:
+            self.frame_reader.stop()
+            self.frame_reader = None
+
+    # 是否为本地视频文件
+    def is_video_file(self, source):
+        source = str(source)
+        return any(ext in source for ext in ('mp4', 'avi', 'mkv', 'flv', 'mov'))
+
+    # 逐帧跟踪预读的视频帧（persist=True 保持帧间的跟踪状态）
+    def track_frames(self, model, reader):
+        for _, frame in reader:
+            yield model.track(frame, persist=True, show=False, verbose=False,
+                              iou=self.iou_thres, conf=self.conf_thres)[0]
 
     # 进行识别——并返回所有结果
     def res_address(self, img_res, result, height, width, model, out, line_counter, speed_obj):
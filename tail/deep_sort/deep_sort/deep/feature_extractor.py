@@ -1,5 +1,10 @@
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
 import torch
-import torchvision.transforms as transforms
+from torchvision.ops import roi_align
 import numpy as np
 import cv2
 import logging
@@ -7,7 +12,7 @@ import logging
 from .model import Net
 
 class Extractor(object):
-    def __init__(self, model_path, use_cuda=True):
+    def __init__(self, model_path, use_cuda=True, half=True):
         self.net = Net(reid=True)
         self.device = "cuda" if torch.cuda.is_available() and use_cuda else "cpu"
         state_dict = torch.load(model_path, map_location=lambda storage, loc: storage)['net_dict']
@@ -15,36 +20,149 @@ class Extractor(object):
         logger = logging.getLogger("root.tracker")
         logger.info("Loading weights from {}... Done!".format(model_path))
         self.net.to(self.device)
+        self.net.eval()
+        # GPU 上使用半精度推理
+        self.half = half and self.device == "cuda"
+        if self.half:
+            self.net.half()
+        self.dtype = torch.float16 if self.half else torch.float32
         self.size = (64, 128)
-        self.norm = transforms.Compose([
-            transforms.ToTensor(),
-            transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225]),
-        ])
-        
+        # 归一化合并为一次乘加：x / 255 * (1 / std) - mean / std
+        mean = torch.tensor([0.485, 0.456, 0.406], device=self.device).view(1, 3, 1, 1)
+        std = torch.tensor([0.229, 0.224, 0.225], device=self.device).view(1, 3, 1, 1)
+        self._scale = (1.0 / (255.0 * std)).to(self.dtype)
+        self._shift = (-mean / std).to(self.dtype)
+        # 复用的 uint8 输入缓冲（GPU 上为锁页内存）；__call__ 与 extract 可能并发，缓冲的写入与拷贝需加锁
+        self._crop_buffer = None
+        self._frame_buffer = None
+        self._buffer_lock = threading.Lock()
+
+    def _host_buffer(self, current, shape):
+        """按需分配（容量不足时扩大）uint8 主机缓冲"""
+        if current is None or current.shape[1:] != shape[1:] or current.shape[0] < shape[0]:
+            current = torch.empty(shape, dtype=torch.uint8, pin_memory=self.device == "cuda")
+        return current
 
+    def _normalize(self, im_batch):
+        """uint8 (N, 3, H, W) -> 归一化后的推理输入"""
+        return im_batch.to(self.dtype) * self._scale + self._shift
 
     def _preprocess(self, im_crops):
         """
-        TODO:
-            1. to float with scale from 0 to 1
-            2. resize to (64, 128) as Market1501 dataset did
-            3. concatenate to a numpy array
-            3. to torch Tensor
-            4. normalize
+        1. 每个裁剪图以 uint8 缩放到 (64, 128)（Market1501 的尺寸），写入预分配的批次缓冲
+        2. 一次拷贝到推理设备
+        3. 在设备上转浮点并归一化
         """
-        def _resize(im, size):
-            return cv2.resize(im.astype(np.float32)/255., size)
+        width, height = self.size
+        count = len(im_crops)
+        with self._buffer_lock:
+            self._crop_buffer = self._host_buffer(self._crop_buffer, (count, height, width, 3))
+            batch = self._crop_buffer.numpy()
+            for i, im in enumerate(im_crops):
+                cv2.resize(im, self.size, dst=batch[i])
+            # 同步拷贝（CPU 上为复制）：释放锁后缓冲可能被下一次调用覆盖
+            im_batch = self._crop_buffer[:count].to(self.device, copy=True)
+        return self._normalize(im_batch.permute(0, 3, 1, 2))
 
-        im_batch = torch.cat([self.norm(_resize(im, self.size)).unsqueeze(0) for im in im_crops], dim=0).float()
-        return im_batch
+    def crop(self, frame, boxes_xyxy):
+        """
+        从整帧裁剪多个目标并缩放为推理输入
+        GPU：整帧只拷贝一次到设备，用 roi_align 一次完成所有目标的裁剪与缩放
+        CPU：整帧转浮点的开销比逐个裁剪后 cv2.resize 更大，走 _preprocess
+        """
+        if self.device != "cuda":
+            crops = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in np.asarray(boxes_xyxy, dtype=np.int64)]
+            with torch.no_grad():
+                return self._preprocess(crops)
 
+        with self._buffer_lock:
+            self._frame_buffer = self._host_buffer(self._frame_buffer, (1,) + frame.shape)
+            self._frame_buffer[0].numpy()[...] = frame
+            # 同步拷贝：拷贝完成后才能复用锁页缓冲
+            frame_t = self._frame_buffer.to(self.device)
+        with torch.no_grad():
+            frame_t = frame_t.permute(0, 3, 1, 2)
+            boxes = torch.as_tensor(np.asarray(boxes_xyxy, dtype=np.float32), device=self.device)
+            rois = torch.cat([torch.zeros((len(boxes), 1), device=self.device), boxes], dim=1)
+            width, height = self.size
+            im_batch = roi_align(frame_t.to(self.dtype), rois.to(self.dtype), output_size=(height, width),
+                                 spatial_scale=1.0, sampling_ratio=2, aligned=True)
+        return self._normalize(im_batch)
 
-    def __call__(self, im_crops):
-        im_batch = self._preprocess(im_crops)
+    def forward(self, im_batch):
+        """对已归一化的批次提取特征"""
         with torch.no_grad():
-            im_batch = im_batch.to(self.device)
             features = self.net(im_batch)
-        return features.cpu().numpy()
+        return features.float().cpu().numpy()
+
+    def extract(self, frame, boxes_xyxy):
+        """直接从整帧提取多个目标的特征"""
+        if len(boxes_xyxy) == 0:
+            return np.empty((0, 0), dtype=np.float32)
+        return self.forward(self.crop(frame, boxes_xyxy))
+
+    def __call__(self, im_crops):
+        with torch.no_grad():
+            im_batch = self._preprocess(im_crops)
+        return self.forward(im_batch)
+
+
+class BatchedExtractor(object):
+    """
+    多路跟踪共享的特征提取器
+    各路在时间窗口内提交的目标合并为一个批次送入 ReID 网络，结果按请求拆分返回
+    """
+
+    def __init__(self, extractor, max_batch_size=256, max_wait_ms=2):
+        self.extractor = extractor
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._requests = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='reid-extractor', daemon=True)
+        self._thread.start()
+
+    def extract(self, frame, boxes_xyxy):
+        """与 Extractor.extract 相同的同步接口"""
+        if len(boxes_xyxy) == 0:
+            return np.empty((0, 0), dtype=np.float32)
+        future = Future()
+        self._requests.put((frame, boxes_xyxy, future))
+        return future.result()
+
+    def __call__(self, im_crops):
+        return self.extractor(im_crops)
+
+    def _collect_batch(self, first):
+        """以第一个请求为起点，在等待窗口内凑批（按目标数限制批次大小）"""
+        batch = [first]
+        total = len(first[1])
+        deadline = time.monotonic() + self.max_wait
+        while total < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            total += len(item[1])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch(self._requests.get())
+            try:
+                crops = [self.extractor.crop(frame, boxes) for frame, boxes, _ in batch]
+                features = self.extractor.forward(torch.cat(crops, dim=0))
+                start = 0
+                for (_, boxes, future), crop in zip(batch, crops):
+                    future.set_result(features[start:start + len(crop)])
+                    start += len(crop)
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
 
 
 if __name__ == '__main__':
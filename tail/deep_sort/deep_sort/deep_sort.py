@@ -12,11 +12,12 @@ __all__ = ['DeepSort']
 
 
 class DeepSort(object):
-    def __init__(self, model_path, max_dist=0.2, min_confidence=0.3, nms_max_overlap=1.0, max_iou_distance=0.7, max_age=70, n_init=3, nn_budget=100, use_cuda=True):
+    def __init__(self, model_path, max_dist=0.2, min_confidence=0.3, nms_max_overlap=1.0, max_iou_distance=0.7, max_age=70, n_init=3, nn_budget=100, use_cuda=True, extractor=None):
         self.min_confidence = min_confidence
         self.nms_max_overlap = nms_max_overlap
 
-        self.extractor = Extractor(model_path, use_cuda=use_cuda)
+        # 可传入多个 DeepSort 共享的特征提取器，避免每路跟踪各加载一份 ReID 网络
+        self.extractor = extractor if extractor is not None else Extractor(model_path, use_cuda=use_cuda)
 
         max_cosine_distance = max_dist
         nn_budget = 100
@@ -92,13 +93,10 @@ class DeepSort(object):
         return t,l,w,h
     
     def _get_features(self, bbox_xywh, ori_img):
-        im_crops = []
-        for box in bbox_xywh:
-            x1,y1,x2,y2 = self._xywh_to_xyxy(box)
-            im = ori_img[y1:y2,x1:x2]
-            im_crops.append(im)
-        if im_crops:
-            features = self.extractor(im_crops)
+        boxes = [self._xywh_to_xyxy(box) for box in bbox_xywh]
+        if boxes:
+            # 所有目标在一个批次中从整帧裁剪、缩放并提取特征
+            features = self.extractor.extract(ori_img, boxes)
         else:
             features = np.array([])
         return features
@@ -21,6 +21,20 @@ def iou(bbox, candidates):
     return area_intersection / (area_bbox + area_candidates - area_intersection)
 
 
+def iou_matrix(bboxes, candidates):
+    """两组 tlwh 框的 IoU 矩阵 (len(bboxes), len(candidates))"""
+    bboxes_tl, bboxes_br = bboxes[:, :2], bboxes[:, :2] + bboxes[:, 2:]
+    candidates_tl, candidates_br = candidates[:, :2], candidates[:, :2] + candidates[:, 2:]
+
+    tl = np.maximum(bboxes_tl[:, None, :], candidates_tl[None, :, :])
+    br = np.minimum(bboxes_br[:, None, :], candidates_br[None, :, :])
+    area_intersection = np.maximum(0., br - tl).prod(axis=2)
+    area_bboxes = bboxes[:, 2:].prod(axis=1)
+    area_candidates = candidates[:, 2:].prod(axis=1)
+    return area_intersection / (
+        area_bboxes[:, None] + area_candidates[None, :] - area_intersection)
+
+
 def iou_cost(tracks, detections, track_indices=None,
              detection_indices=None):
     if track_indices is None:
@@ -28,13 +42,13 @@ def iou_cost(tracks, detections, track_indices=None,
     if detection_indices is None:
         detection_indices = np.arange(len(detections))
 
-    cost_matrix = np.zeros((len(track_indices), len(detection_indices)))
-    for row, track_idx in enumerate(track_indices):
-        if tracks[track_idx].time_since_update > 1:
-            cost_matrix[row, :] = linear_assignment.INFTY_COST
-            continue
-
-        bbox = tracks[track_idx].to_tlwh()
+    cost_matrix = np.full(
+        (len(track_indices), len(detection_indices)), linear_assignment.INFTY_COST)
+    # 超过一帧未更新的轨迹不参与 IoU 匹配
+    rows = [row for row, track_idx in enumerate(track_indices)
+            if tracks[track_idx].time_since_update <= 1]
+    if rows and len(detection_indices):
+        bboxes = np.asarray([tracks[track_indices[row]].to_tlwh() for row in rows])
         candidates = np.asarray([detections[i].tlwh for i in detection_indices])
-        cost_matrix[row, :] = 1. - iou(bbox, candidates)
+        cost_matrix[rows] = 1. - iou_matrix(bboxes, candidates)
     return cost_matrix
@@ -109,3 +109,59 @@ class KalmanFilter(object):
             overwrite_b=True)
         squared_maha = np.sum(z * z, axis=0)
         return squared_maha
+
+    def predict_batch(self, means, covariances):
+        """predict 的批量版本：means (N, 8)，covariances (N, 8, 8)"""
+        height = means[:, 3]
+        std_pos = self._std_weight_position * height
+        std_vel = self._std_weight_velocity * height
+        motion_var = np.square(np.stack([
+            std_pos, std_pos, np.full_like(height, 1e-2), std_pos,
+            std_vel, std_vel, np.full_like(height, 1e-5), std_vel], axis=1))
+
+        means = np.dot(means, self._motion_mat.T)
+        covariances = np.matmul(
+            np.matmul(self._motion_mat, covariances), self._motion_mat.T)
+        diag = np.arange(means.shape[1])
+        covariances[:, diag, diag] += motion_var
+        return means, covariances
+
+    def update_batch(self, means, covariances, measurements):
+        """update 的批量版本：measurements (N, 4)"""
+        projected_mean, projected_cov = self.project_batch(means, covariances)
+
+        # K = P H^T S^-1，S 对称，按 S K^T = H P^T 批量求解
+        cross_cov = np.matmul(covariances, self._update_mat.T)
+        kalman_gain = np.linalg.solve(
+            projected_cov, cross_cov.transpose(0, 2, 1)).transpose(0, 2, 1)
+        innovation = measurements - projected_mean
+
+        new_means = means + np.einsum('nij,nj->ni', kalman_gain, innovation)
+        new_covariances = covariances - np.matmul(
+            np.matmul(kalman_gain, projected_cov), kalman_gain.transpose(0, 2, 1))
+        return new_means, new_covariances
+
+    def project_batch(self, means, covariances):
+        """project 的批量版本：means (N, 8)，covariances (N, 8, 8)"""
+        std = self._std_weight_position * means[:, 3]
+        diag = np.stack([std, std, np.full_like(std, 1e-1), std], axis=1)
+        projected_mean = means[:, :4]
+        projected_cov = covariances[:, :4, :4] + np.einsum(
+            'ni,ij->nij', np.square(diag), np.eye(4))
+        return projected_mean, projected_cov
+
+    def gating_distance_batch(self, means, covariances, measurements,
+                              only_position=False):
+        """
+        所有轨迹到所有观测的马氏距离平方 (N, M)
+        各轨迹的投影协方差堆叠后一次批量 Cholesky 分解与求解
+        """
+        means, covariances = self.project_batch(means, covariances)
+        if only_position:
+            means, covariances = means[:, :2], covariances[:, :2, :2]
+            measurements = measurements[:, :2]
+
+        cholesky_factor = np.linalg.cholesky(covariances)
+        d = measurements[None, :, :] - means[:, None, :]
+        z = np.linalg.solve(cholesky_factor, d.transpose(0, 2, 1))
+        return np.sum(z * z, axis=1)
@@ -26,21 +26,23 @@ def min_cost_matching(
 
     row_indices, col_indices = linear_assignment(cost_matrix)
 
-    matches, unmatched_tracks, unmatched_detections = [], [], []
-    for col, detection_idx in enumerate(detection_indices):
-        if col not in col_indices:
-            unmatched_detections.append(detection_idx)
-    for row, track_idx in enumerate(track_indices):
-        if row not in row_indices:
-            unmatched_tracks.append(track_idx)
-    for row, col in zip(row_indices, col_indices):
+    matched_rows, matched_cols = set(row_indices.tolist()), set(col_indices.tolist())
+    unmatched_detections = [
+        detection_idx for col, detection_idx in enumerate(detection_indices)
+        if col not in matched_cols]
+    unmatched_tracks = [
+        track_idx for row, track_idx in enumerate(track_indices)
+        if row not in matched_rows]
+    matches = []
+    accepted = cost_matrix[row_indices, col_indices] <= max_distance
+    for row, col, ok in zip(row_indices, col_indices, accepted):
         track_idx = track_indices[row]
         detection_idx = detection_indices[col]
-        if cost_matrix[row, col] > max_distance:
+        if ok:
+            matches.append((track_idx, detection_idx))
+        else:
             unmatched_tracks.append(track_idx)
             unmatched_detections.append(detection_idx)
-        else:
-            matches.append((track_idx, detection_idx))
     return matches, unmatched_tracks, unmatched_detections
 
 
@@ -82,9 +84,9 @@ def gate_cost_matrix(
     gating_threshold = kalman_filter.chi2inv95[gating_dim]
     measurements = np.asarray(
         [detections[i].to_xyah() for i in detection_indices])
-    for row, track_idx in enumerate(track_indices):
-        track = tracks[track_idx]
-        gating_distance = kf.gating_distance(
-            track.mean, track.covariance, measurements, only_position)
-        cost_matrix[row, gating_distance > gating_threshold] = gated_cost
+    means = np.asarray([tracks[i].mean for i in track_indices])
+    covariances = np.asarray([tracks[i].covariance for i in track_indices])
+    gating_distance = kf.gating_distance_batch(
+        means, covariances, measurements, only_position)
+    cost_matrix[gating_distance > gating_threshold] = gated_cost
     return cost_matrix
@@ -29,31 +29,123 @@ def _nn_cosine_distance(x, y):
     return distances.min(axis=0)
 
 
-class NearestNeighborDistanceMetric(object):
+def _normalize_rows(x):
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    return x / np.maximum(norms, 1e-12)
 
-    def __init__(self, metric, matching_threshold, budget=None):
 
+class NearestNeighborDistanceMetric(object):
+    """
+    最近邻距离度量
+    特征库为一块预分配矩阵 (槽位, 环形缓冲长度, 特征维度)：每个目标占用一个槽位，
+    最近 budget 个特征以环形缓冲保存；余弦距离下特征入库时只归一化一次，
+    distance() 用一次矩阵乘法加按槽位分段取最小值得到整张代价矩阵
+    """
 
-        if metric == "euclidean":
-            self._metric = _nn_euclidean_distance
-        elif metric == "cosine":
-            self._metric = _nn_cosine_distance
-        else:
+    def __init__(self, metric, matching_threshold, budget=None, capacity=64):
+        if metric not in ("euclidean", "cosine"):
             raise ValueError(
                 "Invalid metric; must be either 'euclidean' or 'cosine'")
+        self.metric = metric
         self.matching_threshold = matching_threshold
         self.budget = budget
-        self.samples = {}
+        # 每个槽位的环形缓冲长度；不限制 budget 时按需扩大
+        self._ring = budget if budget else 16
+        self._capacity = capacity
+        self._gallery = None
+        self._sq_norms = None
+        self._head = np.zeros(capacity, dtype=np.int64)
+        self._count = np.zeros(capacity, dtype=np.int64)
+        self._slots = {}
+        self._free = list(range(capacity - 1, -1, -1))
+
+    def _prepare(self, features):
+        features = np.asarray(features, dtype=np.float32)
+        if self.metric == "cosine" and len(features):
+            features = _normalize_rows(features)
+        return features
+
+    def _grow_capacity(self):
+        """槽位用完时容量翻倍"""
+        capacity = self._capacity
+        self._gallery = np.concatenate([self._gallery, np.zeros_like(self._gallery)])
+        self._sq_norms = np.concatenate([self._sq_norms, np.zeros_like(self._sq_norms)])
+        self._head = np.concatenate([self._head, np.zeros(capacity, dtype=np.int64)])
+        self._count = np.concatenate([self._count, np.zeros(capacity, dtype=np.int64)])
+        self._free.extend(range(2 * capacity - 1, capacity - 1, -1))
+        self._capacity = 2 * capacity
+
+    def _grow_ring(self, required):
+        """不限制 budget 时扩大环形缓冲（此时缓冲从不回绕，已有特征位置不变）"""
+        ring = self._ring
+        while ring < required:
+            ring *= 2
+        pad = ring - self._ring
+        self._gallery = np.pad(self._gallery, ((0, 0), (0, pad), (0, 0)))
+        self._sq_norms = np.pad(self._sq_norms, ((0, 0), (0, pad)))
+        self._head = self._count.copy()
+        self._ring = ring
+
+    def _slot(self, target):
+        slot = self._slots.get(target)
+        if slot is None:
+            if not self._free:
+                self._grow_capacity()
+            slot = self._free.pop()
+            self._head[slot] = 0
+            self._count[slot] = 0
+            self._slots[target] = slot
+        return slot
 
     def partial_fit(self, features, targets, active_targets):
-        for feature, target in zip(features, targets):
-            self.samples.setdefault(target, []).append(feature)
-            if self.budget is not None:
-                self.samples[target] = self.samples[target][-self.budget:]
-        self.samples = {k: self.samples[k] for k in active_targets}
+        """写入新特征并回收不再活跃的目标"""
+        features = self._prepare(features)
+        if len(features):
+            if self._gallery is None:
+                dim = features.shape[1]
+                self._gallery = np.zeros((self._capacity, self._ring, dim), dtype=np.float32)
+                self._sq_norms = np.zeros((self._capacity, self._ring), dtype=np.float32)
+            slots = np.array([self._slot(target) for target in targets], dtype=np.int64)
+
+            # 每个特征在同一目标本次输入中的序号
+            order = np.argsort(slots, kind="stable")
+            uniq, starts, added = np.unique(slots[order], return_index=True, return_counts=True)
+            rank = np.empty(len(slots), dtype=np.int64)
+            rank[order] = np.arange(len(slots)) - np.repeat(starts, added)
+            total = np.empty(len(slots), dtype=np.int64)
+            total[order] = np.repeat(added, added)
+
+            if not self.budget:
+                required = int((self._count[uniq] + added).max())
+                if required > self._ring:
+                    self._grow_ring(required)
+            # 同一目标一次输入超过缓冲长度时只保留最近的特征
+            keep = rank >= total - self._ring
+            slots, rank, features = slots[keep], rank[keep], features[keep]
+            positions = (self._head[slots] + rank) % self._ring
+            self._gallery[slots, positions] = features
+            self._sq_norms[slots, positions] = np.square(features).sum(axis=1)
+            self._head[uniq] = (self._head[uniq] + added) % self._ring
+            self._count[uniq] = np.minimum(self._count[uniq] + added, self._ring)
+
+        active = set(active_targets)
+        for target in [t for t in self._slots if t not in active]:
+            self._free.append(self._slots.pop(target))
 
     def distance(self, features, targets):
-        cost_matrix = np.zeros((len(targets), len(features)))
-        for i, target in enumerate(targets):
-            cost_matrix[i, :] = self._metric(self.samples[target], features)
-        return cost_matrix
+        """代价矩阵 (len(targets), len(features))：每个目标的特征库到各特征的最小距离"""
+        features = self._prepare(features)
+        if len(targets) == 0 or len(features) == 0:
+            return np.zeros((len(targets), len(features)))
+        slots = np.array([self._slots[target] for target in targets], dtype=np.int64)
+        gallery = self._gallery[slots]
+        num_targets, ring, dim = gallery.shape
+        dots = np.dot(gallery.reshape(-1, dim), features.T).reshape(num_targets, ring, -1)
+        if self.metric == "cosine":
+            distances = 1. - dots
+        else:
+            distances = self._sq_norms[slots][:, :, None] + np.square(features).sum(axis=1)[None, None, :] - 2. * dots
+            np.maximum(distances, 0., out=distances)
+        # 槽位中未写入的位置不参与取最小值
+        distances[np.arange(ring)[None, :] >= self._count[slots][:, None]] = np.inf
+        return distances.min(axis=1).astype(np.float64)
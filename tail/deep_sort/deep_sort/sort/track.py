@@ -1,4 +1,5 @@
 # vim: expandtab:ts=4:sw=4
+import numpy as np
 
 
 class TrackState:
@@ -8,12 +9,49 @@ class TrackState:
     Deleted = 3
 
 
+class TrackStore:
+    """
+    轨迹卡尔曼状态的结构体数组存储：所有轨迹的均值、协方差按槽位堆叠，
+    预测与更新可以对多条轨迹批量计算
+    """
+
+    def __init__(self, capacity=64, ndim=8):
+        self.means = np.zeros((capacity, ndim))
+        self.covariances = np.zeros((capacity, ndim, ndim))
+        self._free = list(range(capacity - 1, -1, -1))
+
+    def _grow(self):
+        """槽位用完时容量翻倍"""
+        capacity = len(self.means)
+        self.means = np.concatenate([self.means, np.zeros_like(self.means)])
+        self.covariances = np.concatenate([self.covariances, np.zeros_like(self.covariances)])
+        self._free.extend(range(2 * capacity - 1, capacity - 1, -1))
+
+    def add(self, mean, covariance):
+        if not self._free:
+            self._grow()
+        slot = self._free.pop()
+        self.means[slot] = mean
+        self.covariances[slot] = covariance
+        return slot
+
+    def release(self, slot):
+        self._free.append(slot)
+
+    def clear(self):
+        self._free = list(range(len(self.means) - 1, -1, -1))
+
+
 class Track:
 
     def __init__(self, mean, covariance, track_id, n_init, max_age,
-                 feature=None):
-        self.mean = mean
-        self.covariance = covariance
+                 feature=None, store=None):
+        # 传入 store 时状态保存在共享的堆叠数组中，否则保存在轨迹自身
+        self._store = store
+        if store is None:
+            self._mean, self._covariance = mean, covariance
+        else:
+            self.slot = store.add(mean, covariance)
         self.track_id = track_id
         self.hits = 1
         self.age = 1
@@ -27,6 +65,28 @@ class Track:
         self._n_init = n_init
         self._max_age = max_age
 
+    @property
+    def mean(self):
+        return self._mean if self._store is None else self._store.means[self.slot]
+
+    @mean.setter
+    def mean(self, value):
+        if self._store is None:
+            self._mean = value
+        else:
+            self._store.means[self.slot] = value
+
+    @property
+    def covariance(self):
+        return self._covariance if self._store is None else self._store.covariances[self.slot]
+
+    @covariance.setter
+    def covariance(self, value):
+        if self._store is None:
+            self._covariance = value
+        else:
+            self._store.covariances[self.slot] = value
+
     def to_tlwh(self):
         ret = self.mean[:4].copy()
         ret[2] *= ret[3]
@@ -40,12 +100,20 @@ class Track:
 
     def predict(self, kf):
         self.mean, self.covariance = kf.predict(self.mean, self.covariance)
+        self.mark_predicted()
+
+    def mark_predicted(self):
+        """卡尔曼预测之后的计数更新（批量预测时由 Tracker 调用）"""
         self.age += 1
         self.time_since_update += 1
 
     def update(self, kf, detection):
         self.mean, self.covariance = kf.update(
             self.mean, self.covariance, detection.to_xyah())
+        self.mark_hit(detection)
+
+    def mark_hit(self, detection):
+        """卡尔曼更新之后的特征与状态更新（批量更新时由 Tracker 调用）"""
         self.features.append(detection.feature)
 
         self.hits += 1
@@ -4,7 +4,7 @@ import numpy as np
 from . import kalman_filter
 from . import linear_assignment
 from . import iou_matching
-from .track import Track
+from .track import Track, TrackStore
 
 
 class Tracker:
@@ -16,12 +16,24 @@ class Tracker:
         self.n_init = n_init
 
         self.kf = kalman_filter.KalmanFilter()
+        # 所有轨迹的卡尔曼状态堆叠存放，预测与更新批量计算
+        self.store = TrackStore()
         self.tracks = []
         self._next_id = 1
 
     def predict(self):
+        if not self.tracks:
+            return
+        slots = np.array([track.slot for track in self.tracks])
+        self.store.means[slots], self.store.covariances[slots] = self.kf.predict_batch(
+            self.store.means[slots], self.store.covariances[slots])
         for track in self.tracks:
-            track.predict(self.kf)
+            track.mark_predicted()
+
+    def reset(self):
+        """清空所有轨迹（跟踪ID继续递增）"""
+        self.tracks = []
+        self.store.clear()
 
     def update(self, detections):
         # Run matching cascade.
@@ -29,13 +41,21 @@ class Tracker:
             self._match(detections)
 
         # Update track set.
+        if matches:
+            slots = np.array([self.tracks[track_idx].slot for track_idx, _ in matches])
+            measurements = np.asarray(
+                [detections[detection_idx].to_xyah() for _, detection_idx in matches])
+            self.store.means[slots], self.store.covariances[slots] = self.kf.update_batch(
+                self.store.means[slots], self.store.covariances[slots], measurements)
         for track_idx, detection_idx in matches:
-            self.tracks[track_idx].update(
-                self.kf, detections[detection_idx])
+            self.tracks[track_idx].mark_hit(detections[detection_idx])
         for track_idx in unmatched_tracks:
             self.tracks[track_idx].mark_missed()
         for detection_idx in unmatched_detections:
             self._initiate_track(detections[detection_idx])
+        for track in self.tracks:
+            if track.is_deleted():
+                self.store.release(track.slot)
         self.tracks = [t for t in self.tracks if not t.is_deleted()]
 
         # Update distance metric.
@@ -94,5 +114,5 @@ class Tracker:
         mean, covariance = self.kf.initiate(detection.to_xyah())
         self.tracks.append(Track(
             mean, covariance, self._next_id, self.n_init, self.max_age,
-            detection.feature))
+            detection.feature, store=self.store))
         self._next_id += 1
@@ -0,0 +1,97 @@
+"""
+deep_sort 关联阶段微基准：不同轨迹数量下每帧的关联耗时
+
+在 tail 目录下运行：
+    python -m deep_sort.utils.benchmark --tracks 10 50 100 200 --frames 200
+"""
+import argparse
+import time
+
+import numpy as np
+
+from deep_sort.deep_sort.sort import kalman_filter, linear_assignment
+from deep_sort.deep_sort.sort.detection import Detection
+from deep_sort.deep_sort.sort.nn_matching import NearestNeighborDistanceMetric
+from deep_sort.deep_sort.sort.tracker import Tracker
+
+
+class _Scene(object):
+    """匀速运动的合成目标，外观特征固定加噪声"""
+
+    def __init__(self, num_objects, feature_dim=512, seed=0):
+        self.rng = np.random.default_rng(seed)
+        self.positions = self.rng.uniform(0, 1920, (num_objects, 2))
+        self.velocities = self.rng.normal(0, 2, (num_objects, 2))
+        self.sizes = self.rng.uniform(30, 120, (num_objects, 2))
+        self.features = self.rng.normal(size=(num_objects, feature_dim)).astype(np.float32)
+
+    def step(self):
+        self.positions += self.velocities
+        noise = self.rng.normal(0, 0.05, self.features.shape).astype(np.float32)
+        features = self.features + noise
+        return [Detection(np.r_[pos, size], 0.9, feature)
+                for pos, size, feature in zip(self.positions, self.sizes, features)]
+
+
+def _legacy_gate(kf, cost_matrix, tracks, measurements, gating_threshold):
+    """逐轨迹计算门控距离（向量化之前的做法），作为对照"""
+    for row, track in enumerate(tracks):
+        distance = kf.gating_distance(track.mean, track.covariance, measurements)
+        cost_matrix[row, distance > gating_threshold] = linear_assignment.INFTY_COST
+    return cost_matrix
+
+
+def run(num_tracks, num_frames, warmup=10):
+    metric = NearestNeighborDistanceMetric("cosine", 0.2, 100)
+    tracker = Tracker(metric)
+    scene = _Scene(num_tracks)
+
+    update_times, gate_times, legacy_gate_times = [], [], []
+    gating_threshold = kalman_filter.chi2inv95[4]
+    for frame in range(warmup + num_frames):
+        detections = scene.step()
+
+        start = time.perf_counter()
+        tracker.predict()
+        tracker.update(detections)
+        elapsed = time.perf_counter() - start
+
+        if frame < warmup or not tracker.tracks:
+            continue
+        update_times.append(elapsed)
+
+        measurements = np.asarray([d.to_xyah() for d in detections])
+        indices = list(range(len(tracker.tracks)))
+        cost = np.zeros((len(indices), len(detections)))
+        start = time.perf_counter()
+        linear_assignment.gate_cost_matrix(
+            tracker.kf, cost, tracker.tracks, detections, indices, list(range(len(detections))))
+        gate_times.append(time.perf_counter() - start)
+
+        cost = np.zeros((len(indices), len(detections)))
+        start = time.perf_counter()
+        _legacy_gate(tracker.kf, cost, tracker.tracks, measurements, gating_threshold)
+        legacy_gate_times.append(time.perf_counter() - start)
+
+    return {
+        'tracks': len(tracker.tracks),
+        'update_ms': 1000 * float(np.median(update_times)),
+        'gate_ms': 1000 * float(np.median(gate_times)),
+        'legacy_gate_ms': 1000 * float(np.median(legacy_gate_times)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="deep_sort association benchmark")
+    parser.add_argument("--tracks", type=int, nargs="+", default=[10, 50, 100, 200])
+    parser.add_argument("--frames", type=int, default=200)
+    args = parser.parse_args()
+
+    print("{:>8} {:>12} {:>10} {:>16}".format("tracks", "update(ms)", "gate(ms)", "legacy gate(ms)"))
+    for num_tracks in args.tracks:
+        result = run(num_tracks, args.frames)
+        print("{tracks:>8} {update_ms:>12.3f} {gate_ms:>10.3f} {legacy_gate_ms:>16.3f}".format(**result))
+
+
+if __name__ == '__main__':
+    main()
@@ -8,21 +8,33 @@ import torch
 import supervision as sv
 from ultralytics import YOLO
 from PIL import Image
+from device_utils import get_device, use_half, resolve_weights, is_torch_weights, inference_latency
+import lane_utils
+from tracking_utils import evict_dead_tracks
 
-def load_models():
+def _load_model(weights, task, device):
+    # CPU 上优先加载已导出的 OpenVINO / ONNX 模型
+    weights = resolve_weights(weights, device, task=task)
+    model = YOLO(weights, task=task)
+    if is_torch_weights(weights):
+        model = model.to(device)
+        # 仅GPU转换为半精度，CPU保持fp32
+        if use_half(device):
+            model = model.half()
+    print(f"加载模型 {weights} 到 {device}")
+    return model
+
+def load_models(device=None):
+    device = device or get_device()
     # 加载车辆检测模型
-    model1 = YOLO("weights/car.pt").to('cuda')
+    model1 = _load_model("weights/car.pt", 'detect', device)
     # 加载车道线检测模型
-    model2 = YOLO("weights/lane.pt").to('cuda')
+    model2 = _load_model("weights/lane.pt", 'segment', device)
 
     # 预热模型
     dummy_img = np.zeros((640, 640, 3), dtype=np.uint8)
-    _ = model1.predict(source=dummy_img, imgsz=640, verbose=False)
-    _ = model2.predict(source=dummy_img, imgsz=640, verbose=False)
-
-    # 转换为半精度
-    model1 = model1.half()
-    model2 = model2.half()
+    _ = model1.predict(source=dummy_img, imgsz=640, device=device, verbose=False)
+    _ = model2.predict(source=dummy_img, imgsz=640, device=device, verbose=False)
     
     return model1, model2
 
@@ -33,9 +45,9 @@ def get_lane_mappings():
     return lane_classes, lane_colors
 
 # 加载车道坐标
-def load_lane_polygons():
+def load_lane_polygons(path='lanes_coordinates.json'):
     try:
-        with open('lanes_coordinates.json', 'r') as f:
+        with open(path, 'r') as f:
             lane_data = json.load(f)
             lane_polygons = []
             for lane in lane_data['lanes']:
@@ -54,6 +66,30 @@ def load_lane_polygons():
         print("使用默认车道坐标")
         return lane_polygons
 
+# 车道坐标缓存（按文件修改时间失效）
+_lane_cache = {
+    "polygons": None,
+    "last_modified": None,
+    "path": 'lanes_coordinates.json'
+}
+
+# 加载车道坐标（带缓存，仅在文件修改后重新解析）
+def get_lane_polygons(path=None):
+    path = path or _lane_cache["path"]
+    try:
+        file_modified_time = os.path.getmtime(path)
+    except OSError:
+        file_modified_time = None
+
+    if (_lane_cache["polygons"] is not None and _lane_cache["path"] == path
+            and _lane_cache["last_modified"] == file_modified_time):
+        return _lane_cache["polygons"]
+
+    _lane_cache["polygons"] = load_lane_polygons(path)
+    _lane_cache["last_modified"] = file_modified_time
+    _lane_cache["path"] = path
+    return _lane_cache["polygons"]
+
 # 初始化统计数据
 def init_stats(lane_polygons):
     stats = {i: {'vehicles': set(), 'wait_sum': 0.0, 'wait_count': 0,
@@ -61,119 +97,119 @@ def init_stats(lane_polygons):
              for i in range(len(lane_polygons))}
     return stats
 
-# 处理单帧图像
-def process_image(image, model1, model2, lane_polygons, 
-                 stats, vehicle_times, vehicle_positions, 
-                 frame_count, pixel_to_meter=0.05, include_stats_on_image=False):
-    # 获取车道类别与颜色映射
-    lane_classes, lane_colors = get_lane_mappings()
-    
-    # 并行调用两个模型的推理
-    with torch.no_grad():
+# 两个模型推理
+def run_models(image, model1, model2, engine=None):
+    # 有共享推理引擎时，交给引擎与其他客户端的帧一起批处理
+    if engine is not None:
+        return engine.infer(image)
+
+    device = get_device()
+    with torch.no_grad(), inference_latency.time():
         results1 = model1.predict(
             source=image,
             imgsz=640,
-            device='cuda',
+            device=device,
             verbose=False,
             augment=False
         )
         results2 = model2.predict(
             source=image,
             imgsz=640,
-            device='cuda',
+            device=device,
             verbose=False,
             augment=False
         )
+    return results1, results2
+
+# 处理单帧图像
+def process_image(image, model1, model2, lane_polygons, 
+                 stats, vehicle_times, vehicle_positions, 
+                 frame_count, pixel_to_meter=0.05, include_stats_on_image=False, engine=None, tracker=None):
+    # 获取车道类别与颜色映射
+    lane_classes, lane_colors = get_lane_mappings()
+    
+    # 调用两个模型的推理（有推理引擎时走共享批处理调度）
+    results1, results2 = run_models(image, model1, model2, engine)
     
     # 处理图像
     annotated_frame = image.copy()
     
     # 处理车道分割结果
-    resized_masks = []
-    lane_cls_ids = []
+    mask_count = 0
+    label_map = None
+    lane_types = list(lane_colors)
     if results2[0].masks is not None:
-        masks = results2[0].masks.data.cpu().numpy()
         lane_cls_ids = results2[0].boxes.cls.cpu().numpy().astype(int)
-        
-        # 将每个分割掩码缩放回原始图像尺寸
-        for mask in masks:
-            mask_resized = cv2.resize(mask, (image.shape[1], image.shape[0]),
-                                  interpolation=cv2.INTER_NEAREST)
-            resized_masks.append(mask_resized)
-        
-        # 绘制车道分割掩码
-        for mask, lane_id in zip(resized_masks, lane_cls_ids):
-            lane_type = lane_classes.get(int(lane_id), "others")
-            color = lane_colors[lane_type]
-            overlay = np.zeros_like(image, dtype=np.uint8)
-            overlay[mask > 0] = color
-            annotated_frame = cv2.addWeighted(annotated_frame, 1.0, overlay, 0.3, 0)
+        mask_count = len(lane_cls_ids)
+        # 绘制车道分割掩码：所有掩码合并为一张叠加层后混合一次，同时得到车道类型标签图
+        annotated_frame, label_map = lane_utils.composite_lane_masks(
+            annotated_frame, results2[0].masks.data, lane_cls_ids, lane_classes, lane_colors)
     
     # 处理车辆检测结果并统计
     vehicle_count = 0
     current_time = time.time()
     car_boxes = []
+    # 本帧更新了位置的车辆
+    updated_tracks = []
+    
+    # 车辆与车道匹配计数（基于车道分割掩码）
+    lane_vehicle_count = {lane_type: 0 for lane_type in lane_types}
     
     if results1[0].boxes is not None:
         car_boxes = results1[0].boxes.xyxy.cpu().numpy()
         vehicle_count = len(car_boxes)
         
-        for box in car_boxes:
+        # 底边中点同时落在车道掩码与车道多边形内时，计入该车道（所有车辆一次查表）
+        bottom_x, bottom_y = lane_utils.box_anchors(car_boxes, 'bottom')
+        lane_raster = lane_utils.get_lane_raster(lane_polygons, image.shape)
+        lane_ids = lane_utils.assign_lanes(lane_raster, bottom_x, bottom_y)
+        in_mask = lane_utils.lookup_mask_labels(label_map, bottom_x, bottom_y, image.shape) > 0
+        lane_ids[~in_mask] = -1
+        
+        # 车辆框中心点所在的车道类型
+        center_x, center_y = lane_utils.box_anchors(car_boxes, 'center')
+        center_labels = lane_utils.lookup_mask_labels(label_map, center_x, center_y, image.shape)
+        lane_vehicle_count = lane_utils.count_by_lane_type(center_labels, lane_types)
+        
+        # 跟踪器为每个检测框分配跨帧一致的跟踪ID（没有检测框时也要更新，让丢失的轨迹按时老化）；
+        # 没有跟踪器时每个检测框单独编号
+        if tracker is not None:
+            track_ids = tracker.update(results1[0].boxes, image)
+        else:
+            track_ids = frame_count * 1000 + np.arange(len(car_boxes))
+        
+        for box, lane, track_id, anchor_x, anchor_y in zip(car_boxes.astype(int), lane_ids, track_ids,
+                                                           bottom_x, bottom_y):
             x1, y1, x2, y2 = map(int, box)
-            
-            # 为每个检测框分配一个跟踪ID
-            track_id = frame_count * 1000 + len(car_boxes)
+            track_id = int(track_id)
             
             cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), (0, 0, 255), 2)
             
-            # 计算中心点
-            center_x = int((x1 + x2) / 2)
-            center_y = int(y2)
+            # 车辆不在任何车道内，或尚未被跟踪器确认
+            if lane < 0 or track_id < 0:
+                continue
+            i = int(lane)
+            stats[i]['vehicles'].add(track_id)
             
-            # 检查车辆是否在某车道内
-            vehicle_in_lane = False
-            for mask, lane_id in zip(resized_masks, lane_cls_ids):
-                lane_type = lane_classes.get(int(lane_id), "others")
-                if 0 <= center_x < image.shape[1] and 0 <= center_y < image.shape[0]:
-                    # 检查中心点是否在车道掩码内
-                    if mask[center_y, center_x] > 0:
-                        # 确定在哪个车道多边形内
-                        for i, poly in enumerate(lane_polygons):
-                            if cv2.pointPolygonTest(poly, (center_x, center_y), False) >= 0:
-                                stats[i]['vehicles'].add(track_id)
-                                vehicle_in_lane = True
-                                
-                                # 更新车辆时间和位置信息
-                                if track_id not in vehicle_times:
-                                    vehicle_times[track_id] = {'enter_time': current_time, 'exit_time': None}
-                                else:
-                                    vehicle_times[track_id]['exit_time'] = current_time
-                                    
-                                if track_id not in vehicle_positions:
-                                    vehicle_positions[track_id] = []
-                                vehicle_positions[track_id].append((center_x, center_y, current_time, i))
-                                break
+            # 更新车辆时间和位置信息
+            if track_id not in vehicle_times:
+                vehicle_times[track_id] = {'enter_time': current_time, 'exit_time': None}
+            else:
+                vehicle_times[track_id]['exit_time'] = current_time
+                
+            vehicle_positions.append(track_id, int(anchor_x), int(anchor_y), current_time, i)
+            updated_tracks.append(track_id)
     
-    # 车辆与车道匹配计数（基于车道分割掩码）
-    lane_vehicle_count = {"left_turn": 0, "others": 0}
-    for mask, lane_id in zip(resized_masks, lane_cls_ids):
-        lane_type = lane_classes.get(int(lane_id), "others")
-        for box in car_boxes:
-            x1, y1, x2, y2 = map(int, box)
-            # 车辆框中心点 x
-            cx = int((x1 + x2) / 2)
-            # 车辆框中心点 y
-            cy = int((y1 + y2) / 2)
-            # 确保中心点在图像范围内
-            if 0 <= cx < image.shape[1] and 0 <= cy < image.shape[0]:
-                # 检查中心点是否在车道掩码内
-                if mask[cy, cx] > 0:
-                    lane_vehicle_count[lane_type] += 1
+    # 回收跟踪器已删除的车辆
+    if tracker is not None:
+        evict_dead_tracks(tracker, vehicle_times, vehicle_positions)
     
-    # 计算车辆速度
-    for track_id, positions in vehicle_positions.items():
+    # 计算车辆速度（只计算本帧更新了位置的车辆）
+    for track_id in updated_tracks:
+        positions = vehicle_positions.positions(track_id)
         if len(positions) >= 2:
             (x1, y1, t1, lane1), (x2, y2, t2, lane2) = positions[-2], positions[-1]
+            lane2 = int(lane2)
             distance = np.sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2) * pixel_to_meter
             time_diff = t2 - t1
             if time_diff > 0:
@@ -195,10 +231,10 @@ def process_image(image, model1, model2, lane_polygons,
                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
             y_pos += 30
     
-    return annotated_frame, vehicle_count, stats, lane_vehicle_count, len(resized_masks)
+    return annotated_frame, vehicle_count, stats, lane_vehicle_count, mask_count
 
 # 处理静态图像
-def process_static_image(img_path, model1, model2):
+def process_static_image(img_path, model1, model2, engine=None):
     # 获取数据源
     img = cv2.imread(img_path)
     if img is None:
@@ -208,51 +244,25 @@ def process_static_image(img_path, model1, model2):
     # 获取车道类别与颜色映射
     lane_classes, lane_colors = get_lane_mappings()
     
-    # 加载车道坐标
-    lane_polygons = load_lane_polygons()
+    # 加载车道坐标（与视频流共用缓存，不使车道栅格缓存失效）
+    lane_polygons = get_lane_polygons()
     
-    # 第一个模型推理（车辆检测）
-    results1 = model1.predict(
-        source=img,
-        imgsz=640,
-        device='cuda',
-        verbose=False,
-        augment=False
-    )
-    
-    # 第二个模型推理（车道线检测）
-    results2 = model2.predict(
-        source=img,
-        imgsz=640,
-        device='cuda',
-        verbose=False,
-        augment=False
-    )
+    # 两个模型推理（车辆检测 & 车道线检测）
+    results1, results2 = run_models(img, model1, model2, engine)
     
     # 保存处理后的图片
     res_img = results1[0].orig_img  # 使用第一个模型的原始图像
     
     # 处理车道分割结果
     annotated_frame = res_img.copy()
-    resized_masks = []
-    lane_cls_ids = []
+    label_map = None
+    lane_types = list(lane_colors)
     
     if results2[0].masks is not None:
-        masks = results2[0].masks.data.cpu().numpy()
         lane_cls_ids = results2[0].boxes.cls.cpu().numpy().astype(int)
-        # 将每个分割掩码缩放回原始图像尺寸
-        for mask in masks:
-            mask_resized = cv2.resize(mask, (res_img.shape[1], res_img.shape[0]),
-                                  interpolation=cv2.INTER_NEAREST)
-            resized_masks.append(mask_resized)
-        
-        # 绘制车道分割掩码
-        for mask, lane_id in zip(resized_masks, lane_cls_ids):
-            lane_type = lane_classes.get(int(lane_id), "others")
-            color = lane_colors[lane_type]
-            overlay = np.zeros_like(res_img, dtype=np.uint8)
-            overlay[mask > 0] = color
-            annotated_frame = cv2.addWeighted(annotated_frame, 1.0, overlay, 0.3, 0)
+        # 绘制车道分割掩码：所有掩码合并为一张叠加层后混合一次，同时得到车道类型标签图
+        annotated_frame, label_map = lane_utils.composite_lane_masks(
+            annotated_frame, results2[0].masks.data, lane_cls_ids, lane_classes, lane_colors)
     
     # 处理车辆检测结果
     vehicle_count = 0
@@ -268,42 +278,33 @@ def process_static_image(img_path, model1, model2):
                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
         lane_stats[i] = {'count': 0}
         
+    # 车辆与车道匹配计数（基于车道分割掩码）
+    lane_vehicle_count = {lane_type: 0 for lane_type in lane_types}
+        
     if results1[0].boxes is not None:
         car_boxes = results1[0].boxes.xyxy.cpu().numpy()
         vehicle_count = len(car_boxes)
         
-        for box in car_boxes:
+        # 确定车辆所在车道（底边中点，所有车辆一次查表）
+        bottom_x, bottom_y = lane_utils.box_anchors(car_boxes, 'bottom')
+        lane_raster = lane_utils.get_lane_raster(lane_polygons, res_img.shape)
+        lane_ids = lane_utils.assign_lanes(lane_raster, bottom_x, bottom_y)
+        
+        # 车辆框中心点所在的车道类型
+        center_x, center_y = lane_utils.box_anchors(car_boxes, 'center')
+        center_labels = lane_utils.lookup_mask_labels(label_map, center_x, center_y, res_img.shape)
+        lane_vehicle_count = lane_utils.count_by_lane_type(center_labels, lane_types)
+        
+        for box, lane in zip(car_boxes.astype(int), lane_ids):
             x1, y1, x2, y2 = map(int, box)
             cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), (0, 0, 255), 2)
             
-            # 确定车辆所在车道
-            center_x = int((x1 + x2) / 2)
-            center_y = int(y2)
-            
             # 检查车辆是否在某车道内
-            for i, poly in enumerate(lane_polygons):
-                if cv2.pointPolygonTest(poly, (center_x, center_y), False) >= 0:
-                    lane_stats[i]['count'] += 1
-                    # 在图像上标注车辆所在车道
-                    cv2.putText(annotated_frame, f"In Lane {i}", (x1, y1-10),
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 2)
-                    break
-    
-    # 车辆与车道匹配计数（基于车道分割掩码）
-    lane_vehicle_count = {"left_turn": 0, "others": 0}
-    for mask, lane_id in zip(resized_masks, lane_cls_ids):
-        lane_type = lane_classes.get(int(lane_id), "others")
-        for box in car_boxes:
-            x1, y1, x2, y2 = map(int, box)
-            # 车辆框中心点 x
-            cx = int((x1 + x2) / 2)
-            # 车辆框中心点 y
-            cy = int((y1 + y2) / 2)
-            # 确保中心点在图像范围内
-            if 0 <= cx < res_img.shape[1] and 0 <= cy < res_img.shape[0]:
-                # 检查中心点是否在车道掩码内
-                if mask[cy, cx] > 0:
-                    lane_vehicle_count[lane_type] += 1
+            if lane >= 0:
+                lane_stats[int(lane)]['count'] += 1
+                # 在图像上标注车辆所在车道
+                cv2.putText(annotated_frame, f"In Lane {int(lane)}", (x1, y1-10),
+                           cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 2)
     
     # 在图像上显示总体统计信息
     cv2.putText(annotated_frame, f"Total Vehicles: {vehicle_count}", (10, 30),
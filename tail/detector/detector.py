@@ -14,6 +14,7 @@ from models.experimental import attempt_load
 from utils.datasets import letterbox
 from utils.general import non_max_suppression, scale_coords
 from utils.torch_utils import select_device
+from device_utils import get_device, use_half
 np.float=float
 
 class Detector:
@@ -25,11 +26,14 @@ class Detector:
 
         self.weights = os.path.join(parent_dir, 'weights/yolov5m.pt')
 
-        self.device = '0' if torch.cuda.is_available() else 'cpu'
+        self.device = '0' if get_device() != 'cpu' else 'cpu'
         self.device = select_device(self.device)
+        # 仅GPU使用半精度，CPU保持fp32
+        self.half = use_half(self.device.type)
         model = attempt_load(self.weights, map_location=self.device)
         model.to(self.device).eval()
-        model.half()
+        if self.half:
+            model.half()
 
         self.m = model
         self.names = model.module.names if hasattr(
@@ -42,7 +46,7 @@ class Detector:
         img = img[:, :, ::-1].transpose(2, 0, 1)
         img = np.ascontiguousarray(img)
         img = torch.from_numpy(img).to(self.device)
-        img = img.half()
+        img = img.half() if self.half else img.float()
         img /= 255.0
         if img.ndimension() == 3:
             img = img.unsqueeze(0)
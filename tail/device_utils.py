@@ -0,0 +1,204 @@
+import os
+import time
+import threading
+import importlib.util
+from collections import deque
+
+import cv2
+import torch
+
+# 已选择的推理设备（进程内只选择一次）
+_selected_device = None
+
+
+def select_device(preferred=None):
+    """
+    选择推理设备
+    preferred / 环境变量 INFERENCE_DEVICE: auto | cpu | cuda
+    """
+    preferred = (preferred or os.environ.get('INFERENCE_DEVICE', 'auto')).strip().lower()
+    if preferred == 'cpu':
+        return 'cpu'
+    if preferred.startswith('cuda'):
+        if torch.cuda.is_available():
+            return preferred
+        print(f"请求的设备 {preferred} 不可用，改用CPU推理")
+        return 'cpu'
+    return 'cuda' if torch.cuda.is_available() else 'cpu'
+
+
+def get_device():
+    """获取进程内统一的推理设备"""
+    global _selected_device
+    if _selected_device is None:
+        _selected_device = select_device()
+        if _selected_device == 'cpu':
+            configure_cpu_threads()
+    return _selected_device
+
+
+def use_half(device):
+    """仅在GPU上使用半精度，CPU上保持fp32"""
+    return str(device).startswith('cuda')
+
+
+def configure_cpu_threads(num_threads=None):
+    """
+    设置CPU推理线程数
+    num_threads / 环境变量 CPU_THREADS，为0时使用全部物理核心
+    """
+    if num_threads is None:
+        num_threads = int(os.environ.get('CPU_THREADS', 0))
+    if num_threads <= 0:
+        num_threads = os.cpu_count() or 1
+    torch.set_num_threads(num_threads)
+    try:
+        torch.set_num_interop_threads(max(1, num_threads // 2))
+    except RuntimeError:
+        # interop 线程数只能在并行任务开始前设置一次
+        pass
+    # OpenCV 与 torch 争抢线程会导致延迟抖动，解码/缩放保留少量线程即可
+    cv2.setNumThreads(max(1, num_threads // 4))
+    return num_threads
+
+
+def _backend_available(export_format):
+    """检查导出格式对应的运行时是否已安装"""
+    module = {'onnx': 'onnxruntime', 'openvino': 'openvino'}.get(export_format)
+    return module is not None and importlib.util.find_spec(module) is not None
+
+
+def exported_weights_path(weights, export_format):
+    """返回 .pt 权重对应的导出模型路径（ultralytics 导出命名规则）"""
+    stem, _ = os.path.splitext(weights)
+    if export_format == 'onnx':
+        return stem + '.onnx'
+    if export_format == 'openvino':
+        return stem + '_openvino_model'
+    return None
+
+
+def resolve_weights(weights, device, task=None):
+    """
+    为当前设备选择模型文件
+    CPU 上优先使用已导出的 OpenVINO / ONNX 模型（由 AutoBackend 加载），
+    EXPORT_ON_CPU=1 时若导出模型不存在则在启动时导出一次
+    """
+    if use_half(device):
+        return weights
+
+    formats = [f.strip() for f in os.environ.get('EXPORT_FORMAT', 'openvino,onnx').split(',') if f.strip()]
+    for export_format in formats:
+        if not _backend_available(export_format):
+            continue
+        path = exported_weights_path(weights, export_format)
+        if path and os.path.exists(path):
+            return path
+
+    if os.environ.get('EXPORT_ON_CPU', '0') == '1':
+        from ultralytics import YOLO
+        for export_format in formats:
+            if not _backend_available(export_format):
+                continue
+            try:
+                # 动态 batch，推理引擎可以把多路帧合并为一个批次
+                return YOLO(weights, task=task).export(format=export_format, imgsz=640, half=False, dynamic=True)
+            except Exception as e:
+                print(f"导出 {export_format} 模型失败: {str(e)}")
+
+    return weights
+
+
+def is_torch_weights(weights):
+    """是否为可直接 .to(device) / .half() 的 PyTorch 权重"""
+    return str(weights).endswith('.pt')
+
+
+def exported_batch_size(weights):
+    """
+    导出模型支持的 batch 大小：动态 batch 返回 None，静态 batch 返回固定值
+    无法判断时按静态 batch=1 处理
+    """
+    weights = str(weights)
+    try:
+        if weights.endswith('.onnx'):
+            import onnxruntime
+            session = onnxruntime.InferenceSession(weights, providers=['CPUExecutionProvider'])
+            batch = session.get_inputs()[0].shape[0]
+            return None if isinstance(batch, str) else int(batch)
+        metadata_file = os.path.join(weights, 'metadata.yaml')
+        if os.path.isfile(metadata_file):
+            from ultralytics.utils import yaml_load
+            metadata = yaml_load(metadata_file)
+            if metadata.get('args', {}).get('dynamic'):
+                return None
+            return int(metadata.get('batch', 1))
+    except Exception as e:
+        print(f"读取导出模型 {weights} 的 batch 信息失败: {str(e)}")
+    return 1
+
+
+def model_batch_limit(model, max_batch_size):
+    """模型一次推理能接受的最大帧数（静态 batch 的导出模型不能超过导出时的 batch）"""
+    weights = model.model if isinstance(model.model, str) else None
+    if weights is None or is_torch_weights(weights):
+        return max_batch_size
+    batch = exported_batch_size(weights)
+    return max_batch_size if batch is None else max(1, min(max_batch_size, batch))
+
+
+class LatencyMeter:
+    """滑动窗口的单帧推理延迟统计"""
+
+    def __init__(self, window=200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.total_frames = 0
+
+    def record(self, seconds, frames=1):
+        """记录一次推理耗时，批处理时按帧平均"""
+        per_frame_ms = seconds * 1000.0 / max(1, frames)
+        with self._lock:
+            for _ in range(frames):
+                self._samples.append(per_frame_ms)
+            self.total_frames += frames
+
+    def time(self, frames=1):
+        """计时上下文：with meter.time(): ..."""
+        return _LatencyTimer(self, frames)
+
+    def stats(self):
+        with self._lock:
+            last = self._samples[-1] if self._samples else 0.0
+            samples = sorted(self._samples)
+            total = self.total_frames
+        if not samples:
+            return {'last_ms': 0.0, 'avg_ms': 0.0, 'p95_ms': 0.0, 'fps': 0.0, 'frames': total}
+        avg = sum(samples) / len(samples)
+        p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+        return {
+            'last_ms': round(last, 2),
+            'avg_ms': round(avg, 2),
+            'p95_ms': round(p95, 2),
+            'fps': round(1000.0 / avg, 2) if avg > 0 else 0.0,
+            'frames': total
+        }
+
+
+class _LatencyTimer:
+    def __init__(self, meter, frames):
+        self.meter = meter
+        self.frames = frames
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.meter.record(time.perf_counter() - self.start, self.frames)
+
+
+# 进程内共享的推理延迟统计
+inference_latency = LatencyMeter()
@@ -0,0 +1,217 @@
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+# 路口数量（4x4 路网）
+NUM_INTERSECTIONS = 16
+
+# 默认的训练评估日志
+DEFAULT_LOG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'model_eva.log')
+
+# 未以换行结尾的最后一行，在文件停止写入这么久（秒）之后才按完整行解析
+PARTIAL_LINE_IDLE = 1.0
+
+_STEP_FIELDS = (
+    ('q_loss', re.compile(r'q_loss:([-\d.]+)')),
+    ('rewards', re.compile(r'rewards:([-\d.]+)')),
+    ('delay', re.compile(r'delay:([-\d.]+)')),
+    ('throughput', re.compile(r'throughput:(\d+)')),
+)
+_INTERSECTION_PATTERN = re.compile(r'intersection:(\d+)')
+_REWARD_PATTERN = re.compile(r'mean_episode_reward:([-\d.]+)')
+_QUEUE_PATTERN = re.compile(r'mean_queue:([-\d.]+)')
+_EPISODE_QUEUE_PATTERN = re.compile(r'intersection:(\d+).*mean_queue:([\d.]+)')
+_TEST_PATTERN = re.compile(
+    r"Test step:\d+/\d+,\s*travel time\s*:\s*([\d\.]+),.*?queue:\s*([\d\.]+),\s*delay:\s*([\d\.]+),\s*throughput:\s*(\d+)"
+)
+
+
+class _Column:
+    """可增长的 NumPy 列：容量按倍数扩展，追加摊销 O(1)"""
+
+    def __init__(self, dtype, capacity=1024):
+        self._data = np.empty(capacity, dtype=dtype)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def extend(self, values):
+        count = len(values)
+        if not count:
+            return
+        end = self._size + count
+        if end > len(self._data):
+            grown = np.empty(max(end, 2 * len(self._data)), dtype=self._data.dtype)
+            grown[:self._size] = self._data[:self._size]
+            self._data = grown
+        self._data[self._size:end] = values
+        self._size = end
+
+    def values(self, start=0, end=None):
+        """[start, end) 的只读视图（之后的追加不影响已取出的视图）"""
+        view = self._data[:self._size][start:end]
+        view.flags.writeable = False
+        return view
+
+
+class EvaLogIndex:
+    """
+    model_eva.log 的内存索引
+    日志只完整解析一次，之后按 mtime / 大小变化只读取新追加的字节（训练仍在写日志时增量更新）。
+    解析结果按列保存为 NumPy 数组（_Column）：
+      - 训练指标：q_loss / rewards / delay / throughput（step: 行）
+      - 各路口每个 episode 的 reward / queue（intersection: 行）
+      - 按 episode 分组的各路口 mean_queue（/api/congestion 使用）
+      - 测试指标：travel time / queue / delay / throughput（Test step 行）
+    version 在索引内容变化时递增，供上层缓存判断是否失效
+    """
+
+    def __init__(self, log_file):
+        self.log_file = log_file
+        self.version = 0
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._offset = 0
+        self._inode = None
+        self._pending = b''
+        self.training = {name: _Column(np.float64) for name, _ in _STEP_FIELDS}
+        self.intersections = {i: {'reward': _Column(np.float64), 'queue': _Column(np.float64)}
+                              for i in range(NUM_INTERSECTIONS)}
+        self.tests = {'tt': _Column(np.float64), 'q': _Column(np.float64),
+                      'd': _Column(np.float64), 'tp': _Column(np.int64)}
+        # 按 episode 分组的 mean_queue 直接作为 /api/congestion 的 JSON 结构保存
+        self._episodes = []
+        self._current_episode = []
+
+    def refresh(self):
+        """同步文件的新内容，返回索引是否有变化（文件不存在时抛出 FileNotFoundError）"""
+        with self._lock:
+            stat = os.stat(self.log_file)
+            # 文件被替换或截断时重新解析
+            if self._inode is not None and (stat.st_ino != self._inode or stat.st_size < self._offset):
+                self._reset()
+                self.version += 1
+            self._inode = stat.st_ino
+
+            changed = False
+            if stat.st_size > self._offset:
+                with open(self.log_file, 'rb') as f:
+                    f.seek(self._offset)
+                    chunk = f.read(stat.st_size - self._offset)
+                self._offset += len(chunk)
+                data = self._pending + chunk
+                end = data.rfind(b'\n') + 1
+                self._pending = data[end:]
+                if end:
+                    self._parse(data[:end].decode('utf-8', errors='replace').splitlines())
+                    changed = True
+
+            # 写入方已停止时，把没有换行结尾的最后一行也解析进来
+            if self._pending and time.time() - stat.st_mtime > PARTIAL_LINE_IDLE:
+                self._parse([self._pending.decode('utf-8', errors='replace')])
+                self._pending = b''
+                changed = True
+
+            if changed:
+                self.version += 1
+            return changed
+
+    def _parse(self, lines):
+        # 本批新行先收集到列表，最后一次追加到各列
+        training = {name: [] for name, _ in _STEP_FIELDS}
+        intersections = {i: ([], []) for i in range(NUM_INTERSECTIONS)}
+        tests = {name: [] for name in self.tests}
+        for line in lines:
+            line = line.strip()
+            if line.startswith('step:'):
+                values = [pattern.search(line) for _, pattern in _STEP_FIELDS]
+                if all(values):
+                    for (name, _), match in zip(_STEP_FIELDS, values):
+                        training[name].append(float(match.group(1)))
+            elif line.startswith('intersection:'):
+                self._parse_intersection(line, intersections)
+            elif line.startswith('episode:'):
+                if self._current_episode:
+                    self._episodes.append(self._current_episode)
+                    self._current_episode = []
+            else:
+                match = _TEST_PATTERN.search(line)
+                if match:
+                    tests['tt'].append(float(match.group(1)))
+                    tests['q'].append(float(match.group(2)))
+                    tests['d'].append(float(match.group(3)))
+                    tests['tp'].append(int(match.group(4)))
+
+        for name, values in training.items():
+            self.training[name].extend(values)
+        for i, (rewards, queues) in intersections.items():
+            self.intersections[i]['reward'].extend(rewards)
+            self.intersections[i]['queue'].extend(queues)
+        for name, values in tests.items():
+            self.tests[name].extend(values)
+
+    def _parse_intersection(self, line, intersections):
+        match = _EPISODE_QUEUE_PATTERN.search(line)
+        if match:
+            self._current_episode.append({'id': int(match.group(1)), 'mean_queue': float(match.group(2))})
+
+        index = _INTERSECTION_PATTERN.search(line)
+        reward = _REWARD_PATTERN.search(line)
+        queue = _QUEUE_PATTERN.search(line)
+        if index and reward and queue:
+            series = intersections.get(int(index.group(1)))
+            if series is not None:
+                series[0].append(float(reward.group(1)))
+                series[1].append(float(queue.group(1)))
+
+    def training_data(self):
+        """与 TrafficMetricsVisualizer.data 相同结构的数据（转换为列表，可以修改、直接序列化）"""
+        with self._lock:
+            data = {name: column.values().tolist() for name, column in self.training.items()}
+            data['intersections'] = {i: {'reward': series['reward'].values().tolist(),
+                                         'queue': series['queue'].values().tolist()}
+                                     for i, series in self.intersections.items()}
+            return data
+
+    def intersection_series(self, inter_id, start=0, end=None):
+        """路口 [start, end) 范围内每个 episode 的 (reward 列表, queue 列表)"""
+        with self._lock:
+            series = self.intersections[inter_id]
+            return series['reward'].values(start, end).tolist(), series['queue'].values(start, end).tolist()
+
+    def episodes(self):
+        """按 episode 分组的各路口 mean_queue：[[{id, mean_queue}], ...]"""
+        with self._lock:
+            episodes = list(self._episodes)
+            if self._current_episode:
+                episodes.append(list(self._current_episode))
+            return episodes
+
+    def test_arrays(self):
+        """测试指标数组 (tt, q, d, tp)，为列的只读视图，不复制"""
+        with self._lock:
+            return tuple(self.tests[name].values() for name in ('tt', 'q', 'd', 'tp'))
+
+
+# 进程内共享的日志索引，按文件路径区分
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_log_index(log_file=None, refresh=True):
+    """获取日志索引，默认先同步文件的新内容"""
+    path = os.path.abspath(log_file or DEFAULT_LOG_FILE)
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None:
+            index = EvaLogIndex(path)
+            _indexes[path] = index
+    if refresh:
+        index.refresh()
+    return index
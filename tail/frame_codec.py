@@ -0,0 +1,102 @@
+import base64
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+# 支持的输出图片格式
+FRAME_FORMATS = {
+    'jpeg': ('.jpg', cv2.IMWRITE_JPEG_QUALITY, 'image/jpeg'),
+    'webp': ('.webp', cv2.IMWRITE_WEBP_QUALITY, 'image/webp'),
+}
+
+
+def decode_frame(data):
+    """
+    解码客户端发送的帧
+    支持二进制（bytes / bytearray / memoryview）与 base64 字符串（可带 data URL 前缀）
+    """
+    if isinstance(data, str):
+        if data.startswith('data:'):
+            data = data.split(',', 1)[1]
+        data = base64.b64decode(data)
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    return cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+
+
+def encode_frame(image, fmt='jpeg', quality=90):
+    """编码为 JPEG / WebP 字节"""
+    ext, quality_flag, _ = FRAME_FORMATS.get(fmt, FRAME_FORMATS['jpeg'])
+    result, buffer = cv2.imencode(ext, image, [int(quality_flag), int(quality)])
+    if not result:
+        raise ValueError(f'图像编码失败: {fmt}')
+    return buffer.tobytes()
+
+
+def to_payload(data, fmt='jpeg', binary=True, data_url=False):
+    """
+    转换为 Socket.IO 发送的数据
+    binary=True 时直接发送字节（作为 Socket.IO 二进制附件），否则转为 base64 字符串
+    """
+    if binary:
+        return data
+    text = base64.b64encode(data).decode()
+    if data_url:
+        mime = FRAME_FORMATS.get(fmt, FRAME_FORMATS['jpeg'])[2]
+        return f"data:{mime};base64,{text}"
+    return text
+
+
+class AdaptiveQuality:
+    """
+    根据丢帧情况自适应调整编码质量
+    出现丢帧时降低质量，连续一段时间无丢帧再逐步恢复
+    """
+
+    def __init__(self, quality=90, min_quality=50, step=5, recover_after=30, enabled=True):
+        self.max_quality = quality
+        self.min_quality = min(min_quality, quality)
+        self.quality = quality
+        self.step = step
+        self.recover_after = recover_after
+        self.enabled = enabled
+        self._last_dropped = 0
+        self._stable_frames = 0
+
+    def update(self, dropped_total):
+        """传入累计丢帧数，返回本帧使用的质量"""
+        if not self.enabled:
+            return self.quality
+        if dropped_total > self._last_dropped:
+            self.quality = max(self.min_quality, self.quality - self.step)
+            self._stable_frames = 0
+        else:
+            self._stable_frames += 1
+            if self._stable_frames >= self.recover_after:
+                self.quality = min(self.max_quality, self.quality + self.step)
+                self._stable_frames = 0
+        self._last_dropped = dropped_total
+        return self.quality
+
+
+class FrameEncoder:
+    """在独立线程池中编码结果帧，避免占用推理线程"""
+
+    def __init__(self, max_workers=2):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='frame-encoder')
+
+    def submit(self, image, fmt='jpeg', quality=90, callback=None):
+        """
+        提交编码任务，返回 Future（结果为编码后的字节）
+        callback(data) 在编码完成后于编码线程中调用
+        """
+        def _task():
+            data = encode_frame(image, fmt, quality)
+            if callback is not None:
+                callback(data)
+            return data
+
+        return self._executor.submit(_task)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,134 @@
+import queue
+import threading
+
+import cv2
+
+# 读取结束标记
+_END = object()
+
+
+class FrameReader:
+    """
+    预读视频帧：后台线程解码，推理线程消费，解码与推理并行
+    缓冲区有界（满时解码线程等待），内存占用固定；
+    every_n > 1 时只取出需要处理的帧，跳过的帧只 grab() 不 retrieve()
+    （采样间隔最多 6 帧，远小于关键帧间隔，seek 仍要从关键帧解码，不比逐帧 grab 快）；
+    end_frame 为源视频上的截止帧序号，到达后在解码前停止读取
+    """
+
+    def __init__(self, source, buffer_size=8, every_n=1, max_frames=None, end_frame=None):
+        # source 可以是视频路径 / 摄像头编号，或已打开的 VideoCapture（由调用方负责释放）
+        if isinstance(source, cv2.VideoCapture):
+            self.capture = source
+            self._owns_capture = False
+        else:
+            self.capture = cv2.VideoCapture(source)
+            self._owns_capture = True
+
+        self.every_n = max(1, int(every_n or 1))
+        # 最多输出的帧数 / 源视频截止帧序号（None 表示不限制），达到后不再读取
+        self.max_frames = max_frames
+        self.end_frame = end_frame
+        # 是否因达到帧数限制而结束
+        self.limit_reached = False
+        self._buffer = queue.Queue(maxsize=max(1, int(buffer_size)))
+        self._stopped = threading.Event()
+        self._thread = None
+        self.error = None
+
+        # 视频属性
+        self.fps = self.capture.get(cv2.CAP_PROP_FPS) or 0.0
+        self.width = int(self.capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.frame_count = int(self.capture.get(cv2.CAP_PROP_FRAME_COUNT))
+
+    def isOpened(self):
+        return self.capture.isOpened()
+
+    def start(self):
+        """启动解码线程"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='frame-reader', daemon=True)
+            self._thread.start()
+        return self
+
+    def _put(self, item):
+        """放入缓冲区；缓冲区满时等待，停止时放弃"""
+        while not self._stopped.is_set():
+            try:
+                self._buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _skip(self, index, target):
+        """跳过 [index, target) 之间的帧，返回是否成功"""
+        for _ in range(target - index):
+            if not self.capture.grab():
+                return False
+        return True
+
+    def _run(self):
+        index = 0
+        produced = 0
+        try:
+            while not self._stopped.is_set():
+                if (self.max_frames is not None and produced >= self.max_frames) or \
+                        (self.end_frame is not None and index >= self.end_frame):
+                    self.limit_reached = True
+                    break
+                ret, frame = self.capture.read()
+                if not ret or frame is None:
+                    break
+                if not self._put((index, frame)):
+                    break
+                produced += 1
+                # 定位到下一个采样帧，中间的帧不取出
+                target = index + self.every_n
+                if self.end_frame is not None and target >= self.end_frame:
+                    self.limit_reached = True
+                    break
+                if target > index + 1 and not self._skip(index + 1, target):
+                    break
+                index = target
+        except Exception as e:
+            self.error = e
+        finally:
+            self._put(_END)
+
+    def read(self, timeout=None):
+        """取出下一帧，返回 (帧序号, 帧)；读取结束返回 None"""
+        if self._thread is None:
+            self.start()
+        try:
+            item = self._buffer.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        if item is _END:
+            # 放回结束标记，重复调用 read 仍返回 None
+            self._buffer.put(_END)
+            return None
+        return item
+
+    def __iter__(self):
+        while True:
+            item = self.read()
+            if item is None:
+                return
+            yield item
+
+    def stop(self):
+        """停止解码线程并释放自己打开的 VideoCapture"""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self._owns_capture:
+            self.capture.release()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
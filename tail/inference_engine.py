@@ -0,0 +1,137 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import torch
+
+from device_utils import get_device, inference_latency, model_batch_limit
+
+
+class InferenceEngine:
+    """
+    双模型共享推理引擎
+    车辆检测模型与车道分割模型在同一次调度中完成推理，
+    并把多个客户端（摄像头、视频、图片）在时间窗口内到达的帧合并为一个批次
+    """
+
+    def __init__(self, model1, model2, imgsz=640, device=None,
+                 max_batch_size=8, max_wait_ms=10):
+        # 车辆检测模型与车道分割模型
+        self.model1 = model1
+        self.model2 = model2
+        self.imgsz = imgsz
+        self.device = device or get_device()
+        # 单帧推理延迟统计（批处理耗时按帧平均）
+        self.latency = inference_latency
+
+        # 微批处理参数：单批最大帧数 & 凑批最长等待时间
+        # 静态 batch 的导出模型（ONNX / OpenVINO）限制单批帧数
+        self.max_batch_size = max(1, int(max_batch_size))
+        for model in (model1, model2):
+            self.max_batch_size = model_batch_limit(model, self.max_batch_size)
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+
+        self._requests = queue.Queue()
+        self._thread = None
+        self._running = False
+
+    def start(self):
+        """启动调度线程"""
+        if self._thread is not None and self._thread.is_alive():
+            return self
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='inference-engine', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """停止调度线程，未处理的请求以异常结束"""
+        self._running = False
+        self._requests.put(None)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def submit(self, image):
+        """提交一帧图像，返回 Future，结果为 (results1, results2)"""
+        future = Future()
+        if not self._running:
+            # 引擎未启动时直接同步推理
+            try:
+                results1, results2 = self.predict_batch([image])
+                future.set_result((results1, results2))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        self._requests.put((image, future))
+        return future
+
+    def infer(self, image, timeout=None):
+        """同步接口：返回与 model.predict 相同结构的 (results1, results2)"""
+        return self.submit(image).result(timeout=timeout)
+
+    def predict_batch(self, images):
+        """对一批图像依次执行两个模型的批量推理"""
+        with torch.no_grad(), self.latency.time(frames=len(images)):
+            results1 = self.model1.predict(
+                source=images,
+                imgsz=self.imgsz,
+                device=self.device,
+                verbose=False,
+                augment=False
+            )
+            results2 = self.model2.predict(
+                source=images,
+                imgsz=self.imgsz,
+                device=self.device,
+                verbose=False,
+                augment=False
+            )
+        return results1, results2
+
+    def _collect_batch(self, first):
+        """以第一个请求为起点，在等待窗口内凑满一个批次"""
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                # 停止信号放回队列，交给主循环处理
+                self._requests.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        """调度循环：取请求 -> 凑批 -> 推理 -> 按顺序回填结果"""
+        while self._running:
+            item = self._requests.get()
+            if item is None:
+                break
+            batch = self._collect_batch(item)
+            images = [image for image, _ in batch]
+            try:
+                results1, results2 = self.predict_batch(images)
+                for i, (_, future) in enumerate(batch):
+                    # 保持与单帧 predict 相同的列表结构，方便调用方使用 results[0]
+                    future.set_result(([results1[i]], [results2[i]]))
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+        # 清理残留请求
+        while True:
+            try:
+                item = self._requests.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                item[1].set_exception(RuntimeError('推理引擎已停止'))
@@ -0,0 +1,168 @@
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+import torch
+
+# 车道栅格中“不在任何车道内”的取值
+NO_LANE = 255
+
+
+def build_lane_raster(lane_polygons, height, width):
+    """
+    生成车道编号栅格：每个像素记录所在车道编号，不在车道内为 NO_LANE
+    逆序填充，多边形重叠时编号小的车道优先（与逐个 pointPolygonTest 取第一个匹配一致）
+    """
+    raster = np.full((height, width), NO_LANE, dtype=np.uint8)
+    for i in range(len(lane_polygons) - 1, -1, -1):
+        poly = np.asarray(lane_polygons[i], dtype=np.int32).reshape(-1, 1, 2)
+        cv2.fillPoly(raster, [poly], int(i))
+    return raster
+
+
+class LaneRasterCache:
+    """按帧尺寸缓存车道编号栅格，车道坐标内容变化时全部失效"""
+
+    def __init__(self, max_sizes=8):
+        self.max_sizes = max_sizes
+        self._polygons = None
+        self._polygons_key = None
+        self._rasters = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(lane_polygons):
+        return tuple(np.asarray(poly, dtype=np.int32).tobytes() for poly in lane_polygons)
+
+    def get(self, lane_polygons, shape):
+        height, width = shape[:2]
+        with self._lock:
+            # 同一个列表直接命中；重新加载的列表按内容比较，内容相同不重建
+            if lane_polygons is not self._polygons:
+                key = self._key(lane_polygons)
+                if key != self._polygons_key:
+                    self._polygons_key = key
+                    self._rasters.clear()
+                self._polygons = lane_polygons
+            raster = self._rasters.get((height, width))
+            if raster is None:
+                raster = build_lane_raster(lane_polygons, height, width)
+                self._rasters[(height, width)] = raster
+                while len(self._rasters) > self.max_sizes:
+                    self._rasters.popitem(last=False)
+            else:
+                self._rasters.move_to_end((height, width))
+            return raster
+
+
+# 进程内共享的车道栅格缓存
+_lane_rasters = LaneRasterCache()
+
+
+def get_lane_raster(lane_polygons, shape):
+    """获取当前帧尺寸对应的车道编号栅格（带缓存）"""
+    return _lane_rasters.get(lane_polygons, shape)
+
+
+def box_anchors(boxes, anchor='bottom'):
+    """
+    计算检测框锚点（整数像素坐标）
+    anchor='bottom' 为底边中点，'center' 为中心点
+    """
+    boxes = np.asarray(boxes).reshape(-1, 4).astype(np.int64)
+    xs = (boxes[:, 0] + boxes[:, 2]) // 2
+    if anchor == 'center':
+        ys = (boxes[:, 1] + boxes[:, 3]) // 2
+    else:
+        ys = boxes[:, 3]
+    return xs, ys
+
+
+def assign_lanes(lane_raster, xs, ys):
+    """一次取出所有锚点所在的车道编号，不在车道内（或在图像外）为 -1"""
+    height, width = lane_raster.shape[:2]
+    lane_ids = np.full(len(xs), -1, dtype=np.int64)
+    valid = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+    ids = lane_raster[ys[valid], xs[valid]].astype(np.int64)
+    ids[ids == NO_LANE] = -1
+    lane_ids[valid] = ids
+    return lane_ids
+
+
+def letterbox_region(mask_shape, frame_shape):
+    """
+    掩码为模型输入分辨率（letterbox 缩放 + 居中填充），返回其中对应原始帧的区域
+    (top, bottom, left, right)，计算方式与 ultralytics ops.scale_image 一致
+    同一批次里尺寸不同的帧会被填充到同一输入尺寸，必须先去掉填充再映射回帧
+    """
+    mask_h, mask_w = mask_shape[:2]
+    height, width = frame_shape[:2]
+    gain = min(mask_h / height, mask_w / width)
+    pad_x, pad_y = (mask_w - width * gain) / 2, (mask_h - height * gain) / 2
+    top, left = int(pad_y), int(pad_x)
+    bottom, right = int(mask_h - pad_y), int(mask_w - pad_x)
+    return top, max(bottom, top + 1), left, max(right, left + 1)
+
+
+def composite_lane_masks(frame, masks, cls_ids, lane_classes, lane_colors, alpha=0.3):
+    """
+    合并车道分割掩码：在掩码所在设备上、以模型输出的掩码分辨率生成
+    一张彩色叠加层和一张车道类型标签图（已去掉 letterbox 填充），叠加层只放大一次、与帧混合一次
+    （等价于逐个掩码 cv2.addWeighted(frame, 1.0, overlay, alpha, 0) 的累加效果）
+    标签图每个像素的第 k 位表示是否在第 k 种车道类型（lane_colors 的顺序）的掩码内
+    返回 (混合后的帧, 标签图)
+    """
+    if masks is None or len(cls_ids) == 0:
+        return frame, None
+    lane_types = list(lane_colors)
+    type_ids = [lane_types.index(lane_classes.get(int(cls_id), "others")) for cls_id in cls_ids]
+
+    with torch.no_grad():
+        # 去掉 letterbox 填充，之后掩码与帧只差一个缩放比例
+        top, bottom, left, right = letterbox_region(masks.shape[1:], frame.shape)
+        binary = masks[:, top:bottom, left:right] > 0.5
+        device = binary.device
+        colors = torch.tensor([lane_colors[lane_types[k]] for k in type_ids],
+                              dtype=torch.float32, device=device) * alpha
+        # (N, 3) x (N, h, w) -> (h, w, 3)：所有掩码的颜色一次加权求和
+        overlay = torch.einsum('nc,nhw->hwc', colors, binary.float())
+        overlay = overlay.clamp_(0, 255).round_().to(torch.uint8)
+
+        type_ids = torch.tensor(type_ids, device=device)
+        label_map = torch.zeros(binary.shape[1:], dtype=torch.uint8, device=device)
+        for k in range(len(lane_types)):
+            selected = binary[type_ids == k]
+            if len(selected):
+                label_map |= selected.any(dim=0).to(torch.uint8) << k
+
+        overlay = overlay.cpu().numpy()
+        label_map = label_map.cpu().numpy()
+
+    # 一次放大到帧尺寸、一次饱和相加
+    height, width = frame.shape[:2]
+    overlay = cv2.resize(overlay, (width, height), interpolation=cv2.INTER_NEAREST)
+    return cv2.add(frame, overlay), label_map
+
+
+def lookup_mask_labels(label_map, xs, ys, frame_shape):
+    """
+    取锚点处的掩码标签：帧坐标按最近邻映射到掩码分辨率
+    （与把掩码 INTER_NEAREST 缩放到帧尺寸后再取值一致），无掩码或在图像外为 0
+    """
+    labels = np.zeros(len(xs), dtype=np.uint8)
+    if label_map is None:
+        return labels
+    height, width = frame_shape[:2]
+    mask_h, mask_w = label_map.shape[:2]
+    valid = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+    mx = xs[valid] * mask_w // width
+    my = ys[valid] * mask_h // height
+    labels[valid] = label_map[my, mx]
+    return labels
+
+
+def count_by_lane_type(labels, lane_types):
+    """按车道类型统计锚点数量（每辆车在同一类型中只计一次）"""
+    return {lane_type: int(np.count_nonzero((labels >> k) & 1))
+            for k, lane_type in enumerate(lane_types)}
@@ -0,0 +1,159 @@
+import os
+import threading
+
+from eva_log_index import get_log_index, NUM_INTERSECTIONS
+from traffic_tl_utils_new import get_analyzer
+import traffic_metrics_utils as tmu
+
+# 订阅拥堵数据的房间；路口房间为 intersection_<编号>
+CONGESTION_ROOM = 'congestion'
+
+
+def intersection_room(intersection_id):
+    return f'intersection_{int(intersection_id)}'
+
+
+class LogWatcher:
+    """
+    训练日志推送：一个后台任务定期检查 model_eva.log 和 tl.log，
+    出现新的 episode / 时间步时计算增量，广播到订阅的房间
+      - congestion 房间：新的完整 episode（各路口 mean_queue）
+      - intersection_<编号> 房间：该路口新 episode 的奖励与队列、新增的改善数据、新的信号灯时间步
+    不论打开多少个看板，日志只解析一次
+    """
+
+    def __init__(self, socketio, eva_log_file, net_file, tl_log_file, interval=2.0):
+        self.socketio = socketio
+        self.eva_log_file = eva_log_file
+        self.net_file = net_file
+        self.tl_log_file = tl_log_file
+        self.interval = max(0.2, float(interval))
+        self._started = False
+        self._lock = threading.Lock()
+        # 已推送的完整 episode 数、改善数据条数、信号灯时间步数
+        self._episode_count = None
+        self._result_count = None
+        self._tl_signature = None
+        self._tl_steps = None
+
+    def ensure_started(self):
+        """首次有客户端订阅时启动后台任务"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            self._sync()
+        self.socketio.start_background_task(self._run)
+
+    def _run(self):
+        while True:
+            self.socketio.sleep(self.interval)
+            try:
+                with self._lock:
+                    self.poll()
+            except Exception as e:
+                print(f"日志推送检查失败: {str(e)}")
+
+    def _complete_episodes(self):
+        """已写完（各路口数据齐全）的 episode"""
+        episodes = get_log_index(self.eva_log_file).episodes()
+        if episodes and len(episodes[-1]) < NUM_INTERSECTIONS:
+            episodes = episodes[:-1]
+        return episodes
+
+    @staticmethod
+    def _complete_tl_steps(analyzer):
+        """已写完（16 个路口齐全）的信号灯时间步数"""
+        steps = analyzer.time_steps
+        if steps and len(steps[-1]) < NUM_INTERSECTIONS:
+            return len(steps) - 1
+        return len(steps)
+
+    def _tl_file_signature(self):
+        stat = os.stat(self.tl_log_file)
+        return stat.st_mtime, stat.st_size
+
+    def _sync(self):
+        """以当前日志内容为起点，之后只推送增量"""
+        if os.path.exists(self.eva_log_file):
+            self._episode_count = len(self._complete_episodes())
+            self._result_count = len(tmu.get_traffic_improvement_series(self.eva_log_file))
+        else:
+            self._episode_count = self._result_count = 0
+        if os.path.exists(self.tl_log_file) and os.path.exists(self.net_file):
+            self._tl_signature = self._tl_file_signature()
+            self._tl_steps = self._complete_tl_steps(get_analyzer(self.net_file, self.tl_log_file))
+        else:
+            self._tl_steps = 0
+
+    def snapshot(self):
+        """新订阅者的初始数据：全部完整 episode"""
+        if not os.path.exists(self.eva_log_file):
+            return {'episodes': [], 'total': 0}
+        episodes = self._complete_episodes()
+        return {'episodes': episodes, 'total': len(episodes)}
+
+    def poll(self):
+        """检查一次日志，有增量时广播"""
+        updates = {i: {} for i in range(NUM_INTERSECTIONS)}
+        self._poll_eva_log(updates)
+        self._poll_tl_log(updates)
+        for intersection_id, update in updates.items():
+            if update:
+                update['id'] = intersection_id
+                self.socketio.emit('intersection_update', update, room=intersection_room(intersection_id))
+
+    def _poll_eva_log(self, updates):
+        if not os.path.exists(self.eva_log_file):
+            return
+        episodes = self._complete_episodes()
+        if len(episodes) < self._episode_count:
+            # 日志被重写，从头推送
+            self._episode_count = 0
+            self._result_count = 0
+        new_episodes = episodes[self._episode_count:]
+        if new_episodes:
+            start = self._episode_count
+            self.socketio.emit('congestion_update', {
+                'start': start,
+                'episodes': new_episodes,
+                'total': len(episodes)
+            }, room=CONGESTION_ROOM)
+            # 路口图表的数据点（与 get_intersection_echarts_data 的 X 轴序号一致）
+            index = get_log_index(self.eva_log_file, refresh=False)
+            for intersection_id, update in updates.items():
+                rewards, queues = index.intersection_series(intersection_id, start, len(episodes))
+                if rewards:
+                    update['episodes'] = [{'episode': start + offset, 'reward': reward, 'mean_queue': queue}
+                                          for offset, (reward, queue) in enumerate(zip(rewards, queues))]
+            self._episode_count = len(episodes)
+
+        # 有新的测试结果时推送新增的改善数据（所有路口相同）
+        # 条数与内容取自同一次刷新的结果，两次读取之间追加的测试不会重复推送
+        results = tmu.get_traffic_improvement_series(self.eva_log_file)
+        if len(results) < self._result_count:
+            self._result_count = 0
+        new_results = results[self._result_count:]
+        if new_results:
+            for update in updates.values():
+                update['improvement_data'] = new_results
+        self._result_count = len(results)
+
+    def _poll_tl_log(self, updates):
+        if not (os.path.exists(self.tl_log_file) and os.path.exists(self.net_file)):
+            return
+        signature = self._tl_file_signature()
+        if signature == self._tl_signature:
+            return
+        self._tl_signature = signature
+        analyzer = get_analyzer(self.net_file, self.tl_log_file)
+        complete = self._complete_tl_steps(analyzer)
+        if complete < self._tl_steps:
+            self._tl_steps = 0
+        if complete > self._tl_steps:
+            # 与 /map_point_click 的 traffic_light_data.time_steps 格式相同，前端直接追加
+            for intersection_id in range(min(NUM_INTERSECTIONS, analyzer.phase_matrix.shape[1])):
+                steps = analyzer.build_light_steps(intersection_id, self._tl_steps, complete)
+                if steps:
+                    updates[intersection_id]['light_steps'] = steps
+        self._tl_steps = complete
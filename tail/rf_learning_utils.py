@@ -15,6 +15,9 @@ from collections import deque
 sys.path.append(current_dir)
 import tracker
 from detector.detector import Detector
+from device_utils import get_device
+from frame_reader import FrameReader
+from tracking_utils import TrackHistoryStore
 
 class TimeGenerator:
     def __init__(self):
@@ -285,7 +288,10 @@ class TrafficRLController:
         self.lane_stats = {i: {'vehicles': set(), 'wait_sum': 0.0, 'wait_count': 0,
                           'speed_sum': 0.0, 'speed_count': 0, 'passed': 0} for i in range(5)}
         self.vehicle_times = {}
-        self.vehicle_positions = {}
+        # 每辆车定长的轨迹历史，跟踪器删除轨迹后回收
+        self.vehicle_positions = TrackHistoryStore()
+        # 每次处理使用独立的跟踪实例，多路视频的轨迹互不干扰
+        self.deepsort = tracker.create_deepsort()
         
     def _add_output(self, output):
         """添加输出信息，并触发回调（如果有）"""
@@ -333,22 +339,24 @@ class TrafficRLController:
         # 初始化统计数据
         self._init_stats()
         
-        # 打开视频文件
-        capture = cv2.VideoCapture(video_path)
-        if not capture.isOpened():
-            self._add_output(f"错误：无法打开视频文件 {video_path}")
-            return self.rl_outputs
-            
-        # 获取视频属性
-        fps = capture.get(cv2.CAP_PROP_FPS)
-        orig_width = int(capture.get(cv2.CAP_PROP_FRAME_WIDTH))
-        orig_height = int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        
         # 应用处理参数
         process_every_n_frames = self.process_params.get('process_every_n_frames', 1)
         max_frames = self.process_params.get('max_frames', None)
         resize_factor = self.process_params.get('resize_factor', 1.0)
         
+        # 打开视频文件（后台线程预读，只取出需要处理的帧）
+        # max_frames 为源视频上的帧数预算（前 max_frames 帧的内容），到达后不再读取
+        reader = FrameReader(video_path, every_n=process_every_n_frames, end_frame=max_frames)
+        if not reader.isOpened():
+            reader.stop()
+            self._add_output(f"错误：无法打开视频文件 {video_path}")
+            return self.rl_outputs
+            
+        # 获取视频属性
+        fps = reader.fps
+        orig_width = reader.width
+        orig_height = reader.height
+        
         self._add_output(f"视频信息: {orig_width}x{orig_height}, {fps} FPS")
         if process_every_n_frames > 1 or max_frames is not None or resize_factor < 1.0:
             optimization_msg = []
@@ -360,6 +368,7 @@ class TrafficRLController:
                 optimization_msg.append(f"分辨率缩放至{target_w}x{target_h}")
             if max_frames is not None:
                 max_seconds = max_frames / fps if fps > 0 else 0
+                optimization_msg.append(f"只处理前{max_seconds:.1f}秒")
                 
             self._add_output(f"优化处理策略: {', '.join(optimization_msg)}")
         
@@ -432,21 +441,18 @@ class TrafficRLController:
             self._add_output(output)
         
         # 视频处理
+        # 降低帧率与最大处理帧数由 FrameReader 完成，这里只收到需要处理的帧
+        reader.start()
         while True:
-            ret, im = capture.read()
-            if im is None:
-                self._add_output("视频读取结束")
-                break
-            
-            # 判断是否达到最大处理帧数
-            if max_frames is not None and processed_frames >= max_frames:
-                self._add_output(f"已达到最大处理帧数({max_frames}帧)，提前结束处理")
+            item = reader.read()
+            if item is None:
+                # 判断是否达到最大处理帧数
+                if reader.limit_reached:
+                    self._add_output(f"已达到最大处理帧数({max_frames}帧)，提前结束处理")
+                else:
+                    self._add_output("视频读取结束")
                 break
-                
-            # 降低帧率以减少处理负担
-            if frame_count % process_every_n_frames != 0:
-                frame_count += 1
-                continue
+            frame_count, im = item
                 
             # 应用分辨率缩放
             if resize_factor < 1.0:
@@ -606,7 +612,7 @@ class TrafficRLController:
             list_bboxs = []
             if self.external_model is not None:
                 # 使用外部传入的YOLO模型进行检测
-                results = self.external_model.predict(source=im, imgsz=640, device='cuda', verbose=False)
+                results = self.external_model.predict(source=im, imgsz=640, device=get_device(), verbose=False)
                 # 转换为与detector.detect()一致的格式: (x1, y1, x2, y2, label, conf)
                 if results[0].boxes is not None:
                     boxes = results[0].boxes.xyxy.cpu().numpy()
@@ -622,7 +628,7 @@ class TrafficRLController:
                 bboxes = self.detector.detect(im)
             
             if len(bboxes) > 0:
-                list_bboxs = tracker.update(bboxes, im)
+                list_bboxs = tracker.update(bboxes, im, deepsort=self.deepsort)
                 output_image_frame = tracker.draw_bboxes(im, list_bboxs, line_thickness=2)
             else:
                 output_image_frame = im.copy()
@@ -630,6 +636,8 @@ class TrafficRLController:
             # 实时统计 Lane 0-4 的车辆情况
             left_turn_count = 0
             straight_count = 0
+            # 本帧更新了位置的车辆：(上一条记录, 本帧记录)
+            updated_tracks = []
             
             for item_bbox in list_bboxs:
                 x1, y1, x2, y2, label, track_id = item_bbox
@@ -647,9 +655,8 @@ class TrafficRLController:
                         else:
                             self.vehicle_times[track_id]['exit_time'] = current_video_time
                             
-                        if track_id not in self.vehicle_positions:
-                            self.vehicle_positions[track_id] = []
-                        self.vehicle_positions[track_id].append((center_x, center_y, current_video_time, i))
+                        previous = self.vehicle_positions.append(track_id, center_x, center_y, current_video_time, i)
+                        updated_tracks.append((previous, (center_x, center_y, current_video_time, i)))
                         
                         if i == 0:
                             left_turn_count += 1
@@ -662,18 +669,24 @@ class TrafficRLController:
                     exit_time = self.vehicle_times[track_id]['exit_time'] or current_video_time
                     wait_time = exit_time - enter_time
                     
-                    if track_id in self.vehicle_positions and len(self.vehicle_positions[track_id]) > 0:
-                        last_lane = self.vehicle_positions[track_id][-1][3]
+                    last_position = self.vehicle_positions.last(track_id)
+                    if last_position is not None:
+                        last_lane = int(last_position[3])
                         if last_lane < 5:
                             self.lane_stats[last_lane]['wait_sum'] += wait_time
                             self.lane_stats[last_lane]['wait_count'] += 1
                             self.lane_stats[last_lane]['passed'] += 1
                     del self.vehicle_times[track_id]
             
-            # 计算车辆速度
-            for track_id, positions in self.vehicle_positions.items():
-                if len(positions) >= 2:
-                    (x1, y1, t1, lane1), (x2, y2, t2, lane2) = positions[-2], positions[-1]
+            # 回收跟踪器已删除的车辆
+            alive_ids = tracker.alive_track_ids(self.deepsort)
+            for track_id in self.vehicle_positions.retain(alive_ids):
+                self.vehicle_times.pop(track_id, None)
+            
+            # 计算车辆速度（增量累加，只计算本帧更新了位置的车辆）
+            for previous, current in updated_tracks:
+                if previous is not None:
+                    (x1, y1, t1, lane1), (x2, y2, t2, lane2) = previous, current
                     distance = np.sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2) * self.pixel_to_meter
                     time_diff = t2 - t1
                     if time_diff > 0 and lane2 < 5:
@@ -697,15 +710,15 @@ class TrafficRLController:
             # 每处理50帧报告一次进度
             if processed_frames % 50 == 0:
                 if max_frames:
-                    progress = min(100, processed_frames / max_frames * 100)
-                    progress_msg = f"处理进度: {progress:.1f}% ({processed_frames}/{max_frames}帧)"
+                    progress = min(100, (frame_count + 1) / max_frames * 100)
+                    progress_msg = f"处理进度: {progress:.1f}% ({frame_count + 1}/{max_frames}帧)"
                     print(progress_msg)
                 else:
                     progress_msg = f"已处理: {processed_frames}帧"
                     print(progress_msg)
                 
         # 释放资源
-        capture.release()
+        reader.stop()
         if show_video:
             cv2.destroyAllWindows()
             
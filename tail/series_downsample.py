@@ -0,0 +1,92 @@
+import numpy as np
+
+# 支持的降采样方法：lttb（最大三角形三桶，保留曲线形状）| minmax（每桶保留最小值和最大值，保留尖峰）
+DOWNSAMPLE_METHODS = ('lttb', 'minmax')
+
+
+def window_bounds(length, start=None, end=None):
+    """缩放窗口 [start, end) 限制到 [0, length) 内"""
+    start = 0 if start is None else min(max(int(start), 0), length)
+    end = length if end is None else min(max(int(end), start), length)
+    return start, end
+
+
+def lttb_indices(y, max_points):
+    """
+    Largest-Triangle-Three-Buckets：首尾点保留，中间每个桶选出与前一个选中点、
+    下一个桶均值构成三角形面积最大的点
+    """
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if max_points >= n:
+        return np.arange(n)
+    if max_points < 3:
+        return np.array([0, n - 1])[:max(max_points, 1)]
+
+    x = np.arange(n, dtype=np.float64)
+    bucket_size = (n - 2) / (max_points - 2)
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0] = 0
+    a = 0
+    for i in range(max_points - 2):
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+        if end >= next_end:
+            # 最后一个桶以终点作为下一个桶
+            avg_x, avg_y = x[n - 1], y[n - 1]
+        else:
+            avg_x, avg_y = x[end:next_end].mean(), y[end:next_end].mean()
+        areas = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(areas))
+        selected[i + 1] = a
+    selected[-1] = n - 1
+    return selected
+
+
+def minmax_indices(y, max_points):
+    """每个桶保留最小值和最大值所在的点（另外保留首尾点）"""
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if max_points >= n:
+        return np.arange(n)
+    num_buckets = max(1, (max_points - 2) // 2)
+    edges = np.linspace(1, n - 1, num_buckets + 1).astype(np.int64)
+    selected = [0, n - 1]
+    for start, end in zip(edges[:-1], edges[1:]):
+        if end > start:
+            selected.append(start + int(np.argmin(y[start:end])))
+            selected.append(start + int(np.argmax(y[start:end])))
+    return np.unique(selected)
+
+
+def select_indices(series, max_points, method='lttb'):
+    """
+    多个等长系列共用一条 x 轴时的降采样下标
+    点数预算按系列平分，各系列选出的下标取并集，总数不超过 max_points
+    """
+    series = [s for s in series if len(s)]
+    if not series:
+        return np.arange(0)
+    length = len(series[0])
+    if not max_points or length <= max_points:
+        return np.arange(length)
+    pick = minmax_indices if method == 'minmax' else lttb_indices
+    budget = max(3, int(max_points) // len(series))
+    indices = np.unique(np.concatenate([pick(s, budget) for s in series]))
+    if len(indices) > max_points:
+        # 预算下限为 3 时可能略超，均匀抽取
+        indices = indices[np.linspace(0, len(indices) - 1, int(max_points)).round().astype(np.int64)]
+    return indices
+
+
+def downsample_series(series, max_points=None, start=None, end=None, method='lttb'):
+    """
+    先按缩放窗口截取，再降采样
+    返回 (x 轴下标列表, 各系列降采样后的列表)，x 轴下标为原始序号
+    """
+    length = len(series[0]) if series else 0
+    start, end = window_bounds(length, start, end)
+    windowed = [np.asarray(s[start:end]) for s in series]
+    indices = select_indices(windowed, max_points, method)
+    return (start + indices).tolist(), [s[indices].tolist() for s in windowed]
@@ -0,0 +1,161 @@
+import time
+import threading
+from collections import deque
+
+import detection_utils as det_utils
+from tracking_utils import create_tracker, TrackHistoryStore
+
+
+class StreamSession:
+    """
+    单个摄像头客户端（request.sid）的实时流状态
+    缓存车道坐标，并在帧之间保留统计数据与车辆轨迹；
+    接收队列只保留最新的若干帧（latest-frame-wins），处理不过来的旧帧直接丢弃
+    """
+
+    def __init__(self, sid, history_seconds=10.0, max_queued=1, max_in_flight=2, frame_rate=8):
+        self.sid = sid
+        # 车辆位置历史保留时长（秒），避免轨迹字典无限增长
+        self.history_seconds = history_seconds
+
+        # 接收队列与流控参数
+        self.max_in_flight = max_in_flight
+        self.pending = deque(maxlen=max(1, max_queued))
+        self.worker_active = False
+        self.received = 0
+        self.processed = 0
+        self.dropped = 0
+        self.queue_lock = threading.Lock()
+
+        # 结果帧传输：是否使用二进制、编码质量控制、上一帧的编码任务
+        self.binary = False
+        self.quality = None
+        self.pending_encode = None
+
+        # 多目标跟踪器（每个客户端独立），frame_rate 为客户端发送帧率
+        self.frame_rate = frame_rate
+        self.tracker = None
+
+        self.lane_polygons = None
+        self.stats = None
+        self.vehicle_times = {}
+        self.vehicle_positions = TrackHistoryStore()
+        self.frame_count = 0
+
+        self.created_at = time.time()
+        self.last_active = self.created_at
+        # 同一客户端的帧按顺序处理
+        self.lock = threading.Lock()
+
+        self.refresh_lanes()
+
+    def refresh_lanes(self):
+        """车道坐标文件变化时重新加载并重置统计"""
+        lane_polygons = det_utils.get_lane_polygons()
+        if lane_polygons is not self.lane_polygons:
+            self.lane_polygons = lane_polygons
+            self.reset()
+        return self.lane_polygons
+
+    def reset(self):
+        """重置统计数据、车辆轨迹与跟踪器"""
+        if self.tracker is None:
+            self.tracker = create_tracker(frame_rate=self.frame_rate)
+        else:
+            self.tracker.reset()
+        self.stats = det_utils.init_stats(self.lane_polygons)
+        self.vehicle_times = {}
+        self.vehicle_positions.clear()
+
+    def touch(self):
+        self.last_active = time.time()
+
+    def offer(self, payload):
+        """
+        放入一帧待处理数据
+        返回 (是否挤掉了旧帧, 是否需要启动处理任务)
+        """
+        with self.queue_lock:
+            self.received += 1
+            dropped = len(self.pending) == self.pending.maxlen
+            if dropped:
+                self.dropped += 1
+            self.pending.append(payload)
+            start_worker = not self.worker_active
+            self.worker_active = True
+        return dropped, start_worker
+
+    def take(self):
+        """取出下一帧；队列为空时标记处理任务结束并返回 None"""
+        with self.queue_lock:
+            if not self.pending:
+                self.worker_active = False
+                return None
+            return self.pending.popleft()
+
+    def mark_processed(self):
+        with self.queue_lock:
+            self.processed += 1
+
+    def flow_state(self):
+        """流控状态，随 frame_ack 发送给客户端"""
+        with self.queue_lock:
+            return {
+                'max_in_flight': self.max_in_flight,
+                'queued': len(self.pending),
+                'received': self.received,
+                'processed': self.processed,
+                'dropped': self.dropped
+            }
+
+    def prune_history(self, now=None):
+        """清理超过保留时长未更新的车辆"""
+        now = now or time.time()
+        for track_id in self.vehicle_positions.expire(now - self.history_seconds):
+            self.vehicle_times.pop(track_id, None)
+
+    def is_idle(self, idle_timeout, now=None):
+        now = now or time.time()
+        return now - self.last_active > idle_timeout
+
+
+class StreamSessionManager:
+    """按 sid 管理实时流会话，断开连接或空闲超时后回收"""
+
+    def __init__(self, idle_timeout=60.0, history_seconds=10.0, max_queued=1, max_in_flight=2):
+        self.idle_timeout = idle_timeout
+        self.history_seconds = history_seconds
+        self.max_queued = max_queued
+        self.max_in_flight = max_in_flight
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def get(self, sid):
+        """获取（不存在则创建）会话"""
+        with self._lock:
+            session = self._sessions.get(sid)
+            if session is None:
+                session = StreamSession(sid, history_seconds=self.history_seconds,
+                                        max_queued=self.max_queued,
+                                        max_in_flight=self.max_in_flight)
+                self._sessions[sid] = session
+            session.touch()
+            return session
+
+    def remove(self, sid):
+        with self._lock:
+            return self._sessions.pop(sid, None)
+
+    def evict_idle(self):
+        """回收空闲超时的会话，返回被回收的 sid 列表"""
+        now = time.time()
+        with self._lock:
+            expired = [sid for sid, session in self._sessions.items()
+                       if session.is_idle(self.idle_timeout, now)]
+            for sid in expired:
+                del self._sessions[sid]
+        return expired
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
@@ -0,0 +1,85 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tracking_utils import UltralyticsTracker, match_boxes  # noqa: E402
+
+
+class FakeBoxes:
+    """模拟 ultralytics Results.boxes（cpu() / numpy() 返回自身）"""
+
+    def __init__(self, xyxy, conf=0.9):
+        self.xyxy = np.asarray(xyxy, dtype=np.float32)
+        self.xywh = np.concatenate([(self.xyxy[:, :2] + self.xyxy[:, 2:]) / 2,
+                                    self.xyxy[:, 2:] - self.xyxy[:, :2]], axis=1)
+        self.conf = np.full(len(self.xyxy), conf, dtype=np.float32)
+        self.cls = np.full(len(self.xyxy), 2, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.xyxy)
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self
+
+
+def moving_boxes(frame_index, count, offset=0):
+    return FakeBoxes([[offset + 100 * i + 2 * frame_index, 50, offset + 100 * i + 40 + 2 * frame_index, 90]
+                      for i in range(count)])
+
+
+def run(tracker, frames, count, start=0, offset=0):
+    ids = set()
+    for f in range(start, start + frames):
+        ids.update(tracker.update(moving_boxes(f, count, offset), None).tolist())
+    ids.discard(-1)
+    return ids
+
+
+def test_match_boxes_one_to_one():
+    pytest.importorskip('scipy')
+    # 两个检测框都与跟踪框 0 重叠最多，只能有一个匹配上
+    iou = np.array([[0.9, 0.4],
+                    [0.8, 0.1],
+                    [0.1, 0.2]])
+    det_index, track_index = match_boxes(iou)
+    assert sorted(zip(det_index.tolist(), track_index.tolist())) == [(0, 1), (1, 0)]
+
+
+def test_ids_unique_after_other_tracker_created():
+    pytest.importorskip('torch')
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    first = UltralyticsTracker()
+    ids_before = run(first, 5, 3)
+    assert len(ids_before) == 3
+
+    # 新建第二个跟踪器不影响第一个跟踪器已有的ID
+    second = UltralyticsTracker()
+    run(second, 5, 2, offset=300)
+    first.update(moving_boxes(5, 5), frame)
+    ids_after = run(first, 3, 5, start=6)
+    assert ids_before <= ids_after
+    assert len(ids_after) == 5
+
+
+def test_ids_unique_after_other_tracker_reset():
+    pytest.importorskip('torch')
+    first = UltralyticsTracker()
+    ids_before = run(first, 5, 3)
+
+    second = UltralyticsTracker()
+    run(second, 5, 2, offset=300)
+    second.reset()
+    run(second, 5, 2, offset=300)
+
+    ids_after = run(first, 5, 5, start=5)
+    assert ids_before <= ids_after
+    assert len(ids_after) == 5
+    # 第一个跟踪器的ID与自身活跃轨迹一一对应
+    assert len(first.alive_ids()) == 5
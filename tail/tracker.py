@@ -6,16 +6,64 @@ import os
 # 获取当前脚本的绝对路径
 current_dir = os.path.dirname(os.path.abspath(__file__))
 
+import threading
+
 from deep_sort.utils.parser import get_config
 from deep_sort.deep_sort import DeepSort
+from deep_sort.deep_sort.deep.feature_extractor import Extractor, BatchedExtractor
+from device_utils import get_device
 np.float=float
 cfg = get_config()
 cfg.merge_from_file(os.path.join(current_dir, "deep_sort/configs/deep_sort.yaml"))
-deepsort = DeepSort(os.path.join(current_dir, cfg.DEEPSORT.REID_CKPT),
+
+# 多路跟踪合并特征提取的批次上限（目标数）与等待窗口
+REID_MAX_BATCH = int(os.environ.get('REID_MAX_BATCH', 256))
+REID_MAX_WAIT_MS = float(os.environ.get('REID_MAX_WAIT_MS', 2))
+
+_extractor = None
+_default_deepsort = None
+_lock = threading.RLock()
+
+
+def get_extractor():
+    """进程内共享的 ReID 特征提取器，首次使用时加载"""
+    global _extractor
+    if _extractor is None:
+        with _lock:
+            if _extractor is None:
+                extractor = Extractor(os.path.join(current_dir, cfg.DEEPSORT.REID_CKPT),
+                                      use_cuda=get_device() != 'cpu')
+                _extractor = BatchedExtractor(extractor, max_batch_size=REID_MAX_BATCH,
+                                              max_wait_ms=REID_MAX_WAIT_MS)
+    return _extractor
+
+
+def create_deepsort():
+    """
+    按配置文件创建一个 DeepSort 实例
+    每个实例有独立的轨迹、卡尔曼状态和特征库，ReID 网络在实例间共享
+    """
+    return DeepSort(os.path.join(current_dir, cfg.DEEPSORT.REID_CKPT),
                     max_dist=cfg.DEEPSORT.MAX_DIST, min_confidence=cfg.DEEPSORT.MIN_CONFIDENCE,
                     nms_max_overlap=cfg.DEEPSORT.NMS_MAX_OVERLAP, max_iou_distance=cfg.DEEPSORT.MAX_IOU_DISTANCE,
                     max_age=cfg.DEEPSORT.MAX_AGE, n_init=cfg.DEEPSORT.N_INIT, nn_budget=cfg.DEEPSORT.NN_BUDGET,
-                    use_cuda=True)
+                    use_cuda=get_device() != 'cpu', extractor=get_extractor())
+
+
+def get_default_deepsort():
+    """未指定实例时使用的默认 DeepSort（兼容原来的模块级跟踪器）"""
+    global _default_deepsort
+    if _default_deepsort is None:
+        with _lock:
+            if _default_deepsort is None:
+                _default_deepsort = create_deepsort()
+    return _default_deepsort
+
+
+def alive_track_ids(deepsort=None):
+    """仍在跟踪（未被删除）的跟踪ID集合"""
+    deepsort = deepsort or get_default_deepsort()
+    return {track.track_id for track in deepsort.tracker.tracks if not track.is_deleted()}
 
 
 def draw_bboxes(image, bboxes, line_thickness):
@@ -56,7 +104,9 @@ def draw_bboxes(image, bboxes, line_thickness):
     return image
 
 
-def update(bboxes, image):
+def update(bboxes, image, deepsort=None):
+    """deepsort 为调用方独占的跟踪实例，不传时使用默认实例"""
+    deepsort = deepsort or get_default_deepsort()
     bbox_xywh = []
     confs = []
     bboxes2draw = []
@@ -0,0 +1,258 @@
+import os
+from contextlib import contextmanager
+
+import numpy as np
+
+# 每辆车保留的最近位置数
+TRACK_HISTORY_LEN = int(os.environ.get('TRACK_HISTORY_LEN', 30))
+
+
+class VehicleTracker:
+    """
+    多目标跟踪器接口
+    update() 输入本帧检测框，返回与检测框一一对应的跟踪ID（未跟踪上的为 -1）
+    """
+
+    def update(self, boxes, frame):
+        raise NotImplementedError
+
+    def alive_ids(self):
+        """仍在跟踪（含短暂丢失）的跟踪ID集合，其余ID的历史可以回收"""
+        raise NotImplementedError
+
+    def reset(self):
+        raise NotImplementedError
+
+
+@contextmanager
+def _keep_global_track_count():
+    """
+    BYTETracker 的构造与 reset() 会把进程全局的 BaseTrack._count 清零，
+    这里在调用结束后恢复，避免影响其他使用全局计数的跟踪器
+    """
+    from ultralytics.trackers.basetrack import BaseTrack
+    count = BaseTrack._count
+    try:
+        yield
+    finally:
+        BaseTrack._count = max(BaseTrack._count, count)
+
+
+class UltralyticsTracker(VehicleTracker):
+    """
+    ultralytics 自带的 ByteTrack / BoT-SORT
+    STrack 的 track_id 来自进程全局计数器，多个会话同时运行时会互相干扰，
+    因此按轨迹对象分配本跟踪器自己的ID
+    """
+
+    def __init__(self, tracker_type='bytetrack', frame_rate=30):
+        from ultralytics.utils import IterableSimpleNamespace, yaml_load
+        from ultralytics.utils.checks import check_yaml
+        from ultralytics.trackers.track import TRACKER_MAP
+
+        cfg = IterableSimpleNamespace(**yaml_load(check_yaml(f'{tracker_type}.yaml')))
+        with _keep_global_track_count():
+            self.tracker = TRACKER_MAP[cfg.tracker_type](args=cfg, frame_rate=max(1, int(round(frame_rate))))
+        # 轨迹对象 -> 本跟踪器的ID；ID只增不减，reset 后也不复用
+        self._ids = {}
+        self._next_id = 0
+
+    def _track_id(self, track):
+        track_id = self._ids.get(track)
+        if track_id is None:
+            self._next_id += 1
+            track_id = self._ids[track] = self._next_id
+        return track_id
+
+    def update(self, boxes, frame):
+        """boxes 为 ultralytics Results.boxes"""
+        det = boxes.cpu().numpy()
+        track_ids = np.full(len(det), -1, dtype=np.int64)
+        self.tracker.update(det, frame)
+        # 与 BYTETracker.update 的输出一致：本帧匹配上的已激活轨迹，idx 为检测框序号
+        for track in self.tracker.tracked_stracks:
+            if track.is_activated and track.frame_id == self.tracker.frame_id:
+                track_ids[int(track.idx)] = self._track_id(track)
+        # 回收已删除轨迹的映射
+        alive = self.tracker.tracked_stracks + self.tracker.lost_stracks
+        self._ids = {track: self._ids[track] for track in alive if track in self._ids}
+        return track_ids
+
+    def alive_ids(self):
+        return set(self._ids.values())
+
+    def reset(self):
+        with _keep_global_track_count():
+            self.tracker.reset()
+        self._ids = {}
+
+
+class DeepSortTracker(VehicleTracker):
+    """本地 deep_sort（外观特征 + 卡尔曼滤波）"""
+
+    def __init__(self, frame_rate=30):
+        from tracker import create_deepsort
+        self.deepsort = create_deepsort()
+
+    def update(self, boxes, frame):
+        xywh = boxes.xywh.cpu().numpy()
+        track_ids = np.full(len(xywh), -1, dtype=np.int64)
+        # 没有检测框时也要更新，丢失的轨迹才会老化并被删除
+        outputs = self.deepsort.update(xywh, boxes.conf.cpu().numpy(), frame)
+        if len(outputs):
+            # deep_sort 输出的是跟踪框，按 IoU 一对一匹配回检测框
+            outputs = np.asarray(outputs)
+            iou = box_iou(boxes.xyxy.cpu().numpy(), outputs[:, :4].astype(np.float32))
+            det_index, track_index = match_boxes(iou)
+            track_ids[det_index] = outputs[track_index, 4]
+        return track_ids
+
+    def alive_ids(self):
+        return {t.track_id for t in self.deepsort.tracker.tracks if not t.is_deleted()}
+
+    def reset(self):
+        self.deepsort.tracker.reset()
+
+
+def box_iou(boxes1, boxes2):
+    """两组 xyxy 框的 IoU 矩阵"""
+    lt = np.maximum(boxes1[:, None, :2], boxes2[None, :, :2])
+    rb = np.minimum(boxes1[:, None, 2:], boxes2[None, :, 2:])
+    inter = np.clip(rb - lt, 0, None).prod(axis=2)
+    area1 = (boxes1[:, 2] - boxes1[:, 0]) * (boxes1[:, 3] - boxes1[:, 1])
+    area2 = (boxes2[:, 2] - boxes2[:, 0]) * (boxes2[:, 3] - boxes2[:, 1])
+    return inter / np.maximum(area1[:, None] + area2[None, :] - inter, 1e-6)
+
+
+def match_boxes(iou, iou_threshold=0.3):
+    """
+    按 IoU 矩阵做一对一匹配（匈牙利算法），低于阈值的不匹配
+    返回 (检测框下标数组, 跟踪框下标数组)
+    """
+    from scipy.optimize import linear_sum_assignment
+
+    if iou.size == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    rows, cols = linear_sum_assignment(-iou)
+    keep = iou[rows, cols] > iou_threshold
+    return rows[keep], cols[keep]
+
+
+def create_tracker(tracker_type=None, frame_rate=30):
+    """
+    创建跟踪器
+    tracker_type / 环境变量 TRACKER_TYPE: bytetrack | botsort | deepsort
+    """
+    tracker_type = (tracker_type or os.environ.get('TRACKER_TYPE', 'bytetrack')).strip().lower()
+    if tracker_type == 'deepsort':
+        return DeepSortTracker(frame_rate=frame_rate)
+    if tracker_type not in ('bytetrack', 'botsort'):
+        print(f"未知的跟踪器类型 {tracker_type}，改用 bytetrack")
+        tracker_type = 'bytetrack'
+    return UltralyticsTracker(tracker_type, frame_rate=frame_rate)
+
+
+def evict_dead_tracks(tracker, vehicle_times, vehicle_positions):
+    """回收跟踪器已删除的车辆的时间与位置记录（vehicle_positions 为 TrackHistoryStore）"""
+    dead = vehicle_positions.retain(tracker.alive_ids())
+    for track_id in dead:
+        vehicle_times.pop(track_id, None)
+    return dead
+
+
+class TrackHistoryStore:
+    """
+    轨迹历史存储：每个跟踪ID占用一个定长环形缓冲（数组实现）
+    每条记录为 (x, y, t, lane)；跟踪器删除轨迹后回收槽位，内存不随视频时长增长
+    """
+
+    def __init__(self, history_len=TRACK_HISTORY_LEN, capacity=256):
+        self.history_len = max(2, int(history_len))
+        self._data = np.zeros((capacity, self.history_len, 4), dtype=np.float64)
+        # 每个槽位下一次写入的位置与已写入的记录数
+        self._head = np.zeros(capacity, dtype=np.int64)
+        self._count = np.zeros(capacity, dtype=np.int64)
+        self._slots = {}
+        self._free = list(range(capacity - 1, -1, -1))
+
+    def __contains__(self, track_id):
+        return track_id in self._slots
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __iter__(self):
+        return iter(self._slots)
+
+    def _grow(self):
+        """槽位用完时容量翻倍"""
+        capacity = len(self._data)
+        self._data = np.concatenate([self._data, np.zeros_like(self._data)])
+        self._head = np.concatenate([self._head, np.zeros(capacity, dtype=np.int64)])
+        self._count = np.concatenate([self._count, np.zeros(capacity, dtype=np.int64)])
+        self._free.extend(range(2 * capacity - 1, capacity - 1, -1))
+
+    def _slot(self, track_id):
+        slot = self._slots.get(track_id)
+        if slot is None:
+            if not self._free:
+                self._grow()
+            slot = self._free.pop()
+            self._head[slot] = 0
+            self._count[slot] = 0
+            self._slots[track_id] = slot
+        return slot
+
+    def append(self, track_id, x, y, t, lane):
+        """追加一条记录，返回该轨迹的上一条记录（没有则返回 None）"""
+        slot = self._slot(track_id)
+        previous = self._record(slot, 1).copy() if self._count[slot] else None
+        head = self._head[slot]
+        self._data[slot, head] = (x, y, t, lane)
+        self._head[slot] = (head + 1) % self.history_len
+        self._count[slot] = min(self._count[slot] + 1, self.history_len)
+        return previous
+
+    def _record(self, slot, back):
+        """取倒数第 back 条记录"""
+        return self._data[slot, (self._head[slot] - back) % self.history_len]
+
+    def last(self, track_id):
+        """最近一条记录 (x, y, t, lane)，没有则返回 None"""
+        slot = self._slots.get(track_id)
+        if slot is None or not self._count[slot]:
+            return None
+        return self._record(slot, 1)
+
+    def positions(self, track_id):
+        """按时间顺序返回该轨迹保留的全部记录"""
+        slot = self._slots.get(track_id)
+        if slot is None:
+            return np.empty((0, 4))
+        count = self._count[slot]
+        index = (self._head[slot] - count + np.arange(count)) % self.history_len
+        return self._data[slot, index]
+
+    def remove(self, track_id):
+        slot = self._slots.pop(track_id, None)
+        if slot is not None:
+            self._free.append(slot)
+
+    def expire(self, before):
+        """回收最近一条记录早于 before 的轨迹，返回被回收的跟踪ID"""
+        stale = [track_id for track_id, slot in self._slots.items()
+                 if not self._count[slot] or self._record(slot, 1)[2] < before]
+        for track_id in stale:
+            self.remove(track_id)
+        return stale
+
+    def retain(self, alive_ids):
+        """只保留仍在跟踪的轨迹，返回被回收的跟踪ID"""
+        dead = [track_id for track_id in self._slots if track_id not in alive_ids]
+        for track_id in dead:
+            self.remove(track_id)
+        return dead
+
+    def clear(self):
+        for track_id in list(self._slots):
+            self.remove(track_id)
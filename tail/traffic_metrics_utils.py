@@ -8,6 +8,11 @@ import logging
 import math
 import time
 
+import numpy as np
+
+from eva_log_index import get_log_index
+from series_downsample import downsample_series
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
@@ -31,78 +36,81 @@ def softplus_transform(x, beta=1.0, offset=0.0):
         return z / beta
     return math.log1p(math.exp(z)) / beta
 
-def get_traffic_improvement_data(logfile, beta=2.0, offset=0.0):
+def improvement_array(prev, curr, is_lesser_better=True):
+    """calculate_improvement 的数组版本"""
+    change = curr - prev if not is_lesser_better else prev - curr
+    safe_prev = np.where(prev == 0, 1, prev)
+    return np.where(prev == 0, 0.0, change / safe_prev * 100)
+
+def softplus_array(x, beta=1.0, offset=0.0):
+    """softplus_transform 的数组版本"""
+    z = beta * (x - offset)
+    return np.where(z > 50, z, np.log1p(np.exp(np.minimum(z, 50)))) / beta
+
+def _positive_inverse(x):
+    return np.where(x > 0, 1 / np.where(x > 0, x, 1), 0.0)
+
+def compute_improvement_scores(tt, q, d, tp, beta=2.0, offset=0.0):
     """
-    从日志文件获取交通改善数据
+    对所有相邻测试一次性计算改善分数
+    返回 (congestion_decrease, delay_decrease) 两个数组，长度为测试次数 - 1
     """
-    pattern = re.compile(
-        r"Test step:\d+/\d+,\s*travel time\s*:\s*([\d\.]+),.*?queue:\s*([\d\.]+),\s*delay:\s*([\d\.]+),\s*throughput:\s*(\d+)"
-    )
-    
     # 分配权重
     w1 = {'speed':0.1, 'flow':0.1, 'low_delay':0.6, 'throughput':0.2}
     w2 = {'low_delay':0.50, 'total_delay':0.50}
-    
-    try:
-        with open(logfile, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-            
-        prev = {'tt':None, 'q':None, 'd':None, 'tp':None}
+
+    # —— 正向指标 —— #
+    speed, flow, low_delay = _positive_inverse(tt), _positive_inverse(q), _positive_inverse(d)
+    total_delay = q * d
+    tp = tp.astype(np.float64)
+
+    # —— 分项改善 —— #
+    imp = {
+        'speed': improvement_array(speed[:-1], speed[1:], False),
+        'flow': improvement_array(flow[:-1], flow[1:], False),
+        'low_delay': improvement_array(low_delay[:-1], low_delay[1:], False),
+        'throughput': improvement_array(tp[:-1], tp[1:], False),
+        'total_delay': improvement_array(total_delay[:-1], total_delay[1:], True),
+    }
+
+    # —— 两种 raw overall，Softplus 平滑 —— #
+    raw_old = sum(imp[k] * w1[k] for k in w1)
+    raw_new = sum(imp[k] * w2[k] for k in w2)
+    return softplus_array(raw_old, beta, offset), softplus_array(raw_new, beta, offset)
+
+# 按日志文件缓存的改善数据：{路径: (索引版本, beta, offset, 结果)}
+_improvement_cache = {}
+
+def get_traffic_improvement_series(logfile, beta=2.0, offset=0.0):
+    """
+    计算日志中相邻两次测试之间的交通改善数据序列
+    结果按日志索引版本缓存，日志没有新内容时直接返回（调用方不要修改）
+    """
+    index = get_log_index(logfile)
+    cached = _improvement_cache.get(index.log_file)
+    if cached is not None and cached[:3] == (index.version, beta, offset):
+        return cached[3]
+
+    version = index.version
+    tt, q, d, tp = index.test_arrays()
+    if len(tt) < 2:
         results = []
-        
-        for line in lines:
-            m = pattern.search(line)
-            if not m:
-                continue
-                
-            curr = {
-                'tt': float(m.group(1)),
-                'q': float(m.group(2)),
-                'd': float(m.group(3)),
-                'tp': int(m.group(4))
-            }
-            
-            if prev['tt'] is not None:
-                # —— 正向指标 —— #
-                prev_speed = 1/prev['tt'] if prev['tt']>0 else 0
-                curr_speed = 1/curr['tt'] if curr['tt']>0 else 0
-                prev_flow = 1/prev['q'] if prev['q']>0 else 0
-                curr_flow = 1/curr['q'] if curr['q']>0 else 0
-                prev_ld = 1/prev['d'] if prev['d']>0 else 0
-                curr_ld = 1/curr['d'] if curr['d']>0 else 0
-                
-                # —— 分项改善 —— #
-                imp = {
-                    'speed': calculate_improvement(prev_speed, curr_speed, False),
-                    'flow': calculate_improvement(prev_flow, curr_flow, False),
-                    'low_delay': calculate_improvement(prev_ld, curr_ld, False),
-                    'throughput': calculate_improvement(prev['tp'], curr['tp'], False),
-                }
-                
-                # 计算 total_delay 改善
-                prev_td = prev['q'] * prev['d']
-                curr_td = curr['q'] * curr['d']
-                imp['total_delay'] = calculate_improvement(prev_td, curr_td, True)
-                
-                # —— 两种 raw overall —— #
-                raw_old = sum(imp[k] * w1[k] for k in w1)
-                raw_new = sum(imp[k] * w2[k] for k in w2)
-                
-                # —— Softplus 平滑 —— #
-                old_overall = softplus_transform(raw_old, beta=beta, offset=offset)
-                new_overall = softplus_transform(raw_new, beta=beta, offset=offset)
-                
-                # 保存结果，不添加任何修改
-                results.append({
-                    'congestion_decrease': old_overall,
-                    'delay_decrease': new_overall
-                })
-            
-            prev = curr
-            
+    else:
+        congestion, delay = compute_improvement_scores(tt, q, d, tp, beta=beta, offset=offset)
+        results = [{'congestion_decrease': c, 'delay_decrease': v}
+                   for c, v in zip(congestion.tolist(), delay.tolist())]
+    _improvement_cache[index.log_file] = (version, beta, offset, results)
+    return results
+
+def get_traffic_improvement_data(logfile, beta=2.0, offset=0.0):
+    """
+    从日志文件获取交通改善数据
+    """
+    try:
+        results = get_traffic_improvement_series(logfile, beta=beta, offset=offset)
         # 返回最后一个结果（如果有的话）
         if results:
-            return results[-1]
+            return dict(results[-1])
         return {'congestion_decrease': 0, 'delay_decrease': 0}
         
     except Exception as e:
@@ -122,7 +130,11 @@ class TrafficMetricsVisualizer:
             self.log_file = log_file
             
         logger.info(f"尝试加载日志文件: {self.log_file}")
-        
+
+        # 共享的日志索引（加载失败、使用演示数据时为 None）及其对应的数据版本
+        self._index = None
+        self._data_version = None
+
         # 解析日志文件
         try:
             self.data = self._parse_log(self.log_file)
@@ -144,6 +156,37 @@ class TrafficMetricsVisualizer:
         # 创建训练指标图(始终显示)
         self._create_training_metrics_fig()
     
+    @property
+    def data(self):
+        """最近一次 refresh() 得到的图表数据快照（不读取日志）"""
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        self._data = value
+
+    def refresh(self):
+        """
+        同步日志新内容并返回图表数据快照
+        公开的取数方法开头各调用一次、之后只读这份快照，一次返回的结果不会混合不同版本的数据
+        """
+        if self._index is not None:
+            try:
+                self._index.refresh()
+            except OSError as e:
+                logger.warning(f"同步日志文件失败: {str(e)}")
+            if self._index.version != self._data_version:
+                data = self._index.training_data()
+                if data['q_loss']:
+                    self._data = data
+                self._data_version = self._index.version
+        return self._data
+
+    def data_version(self):
+        """当前图表数据对应的日志索引版本（演示数据为 None）"""
+        self.refresh()
+        return self._data_version if self._index is not None else None
+
     def _get_demo_data(self):
         demo_data = {
             'q_loss': [0.5, 0.45, 0.4, 0.35, 0.3, 0.25, 0.23, 0.2, 0.18, 0.15],
@@ -190,46 +233,12 @@ class TrafficMetricsVisualizer:
             else:
                 raise FileNotFoundError(f"找不到日志文件: {filename}")
         
-        with open(filename, 'r') as f:
-            lines = f.readlines()
-
-        data = {
-            'q_loss': [],
-            'rewards': [],
-            'delay': [],
-            'throughput': [],
-            'intersections': {i: {'reward': [], 'queue': []} for i in range(16)}
-        }
+        # 从共享的日志索引取数据，之后日志追加内容时增量更新
+        index = get_log_index(filename)
+        data = index.training_data()
+        self._index = index
+        self._data_version = index.version
 
-        # 按顺序解析数据，当遇到 step: 行和 intersection: 行
-        for line in lines:
-            line = line.strip()
-            if line.startswith('step:'):
-                # 提取训练指标
-                try:
-                    q_loss = float(re.search(r'q_loss:([-\d.]+)', line).group(1))
-                    rewards_val = float(re.search(r'rewards:([-\d.]+)', line).group(1))
-                    delay = float(re.search(r'delay:([-\d.]+)', line).group(1))
-                    throughput = float(re.search(r'throughput:(\d+)', line).group(1))
-
-                    data['q_loss'].append(q_loss)
-                    data['rewards'].append(rewards_val)
-                    data['delay'].append(delay)
-                    data['throughput'].append(throughput)
-                except (AttributeError, ValueError) as e:
-                    logger.warning(f"解析行失败: {line}, 错误: {str(e)}")
-
-            elif line.startswith('intersection:'):
-                # 提取路口数据
-                try:
-                    idx = int(re.search(r'intersection:(\d+)', line).group(1))
-                    reward = float(re.search(r'mean_episode_reward:([-\d.]+)', line).group(1))
-                    queue = float(re.search(r'mean_queue:([-\d.]+)', line).group(1))
-                    data['intersections'][idx]['reward'].append(reward)
-                    data['intersections'][idx]['queue'].append(queue)
-                except (AttributeError, ValueError) as e:
-                    logger.warning(f"解析行失败: {line}, 错误: {str(e)}")
-        
         # 检查数据是否为空，如果为空则使用示例数据
         if not data['q_loss']:
             logger.warning("从日志文件解析的数据为空，使用演示数据")
@@ -355,8 +364,11 @@ class TrafficMetricsVisualizer:
 
     def get_training_metrics_echarts_option(self):
         """获取训练指标图的ECharts配置选项"""
+        return self._training_metrics_echarts_option(self.refresh())
+
+    def _training_metrics_echarts_option(self, data):
         # 提取数据
-        x_data = list(range(len(self.data['q_loss'])))
+        x_data = list(range(len(data['q_loss'])))
         
         # 构建ECharts配置选项
         option = {
@@ -396,28 +408,28 @@ class TrafficMetricsVisualizer:
                 {
                     'name': 'Q损失',
                     'type': 'line',
-                    'data': self.data['q_loss'],
+                    'data': data['q_loss'],
                     'symbolSize': 8,
                     'yAxisIndex': 0
                 },
                 {
                     'name': '奖励',
                     'type': 'line',
-                    'data': self.data['rewards'],
+                    'data': data['rewards'],
                     'symbolSize': 8,
                     'yAxisIndex': 0
                 },
                 {
                     'name': '延迟',
                     'type': 'line',
-                    'data': self.data['delay'],
+                    'data': data['delay'],
                     'symbolSize': 8,
                     'yAxisIndex': 0
                 },
                 {
                     'name': '吞吐量',
                     'type': 'line',
-                    'data': self.data['throughput'],
+                    'data': data['throughput'],
                     'symbolSize': 8,
                     'yAxisIndex': 1
                 }
@@ -427,12 +439,15 @@ class TrafficMetricsVisualizer:
     
     def get_intersection_echarts_option(self, inter_id):
         """获取指定路口图表的ECharts配置选项"""
+        return self._intersection_echarts_option(self.refresh(), inter_id)
+
+    def _intersection_echarts_option(self, data, inter_id):
         if not 0 <= inter_id < 16:
             return {'error': f'路口ID必须在0-15之间，当前输入: {inter_id}'}
-            
+
         # 提取数据
-        rewards = self.data['intersections'][inter_id]['reward']
-        queues = self.data['intersections'][inter_id]['queue']
+        rewards = data['intersections'][inter_id]['reward']
+        queues = data['intersections'][inter_id]['queue']
         x_data = list(range(len(rewards)))
         
         # 获取交通改善数据
@@ -526,22 +541,31 @@ class TrafficMetricsVisualizer:
         return option
     
     def get_all_echarts_data(self):
-        """获取所有图表的ECharts数据"""
+        """获取所有图表的ECharts数据（基于同一份数据快照）"""
+        snapshot = self.refresh()
         data = {
-            'training_metrics': self.get_training_metrics_echarts_option(),
+            'training_metrics': self._training_metrics_echarts_option(snapshot),
             'intersections': {}
         }
-        
+
         # 添加所有路口数据
         for i in range(16):
-            data['intersections'][i] = self.get_intersection_echarts_option(i)
+            data['intersections'][i] = self._intersection_echarts_option(snapshot, i)
             
         return data
 
     # 获取ECharts格式数据
-    def get_training_metrics_echarts_data(self):
-        """获取训练指标图表的ECharts格式数据"""
-        x_data = list(range(len(self.data['q_loss'])))
+    def get_training_metrics_echarts_data(self, max_points=None, start=None, end=None, method='lttb'):
+        """
+        获取训练指标图表的ECharts格式数据
+        start / end 为缩放窗口（episode 序号，左闭右开），max_points 为每个系列最多返回的点数
+        """
+        return self._training_metrics_echarts_data(self.refresh(), max_points, start, end, method)
+
+    def _training_metrics_echarts_data(self, data, max_points=None, start=None, end=None, method='lttb'):
+        x_data, (q_loss, rewards, delay, throughput) = downsample_series(
+            [data['q_loss'], data['rewards'], data['delay'], data['throughput']],
+            max_points=max_points, start=start, end=end, method=method)
         
         option = {
             'title': {
@@ -584,7 +608,7 @@ class TrafficMetricsVisualizer:
                 {
                     'name': 'Q损失',
                     'type': 'line',
-                    'data': self.data['q_loss'],
+                    'data': q_loss,
                     'symbol': 'circle',
                     'symbolSize': 6,
                     'yAxisIndex': 0
@@ -592,7 +616,7 @@ class TrafficMetricsVisualizer:
                 {
                     'name': '奖励',
                     'type': 'line',
-                    'data': self.data['rewards'],
+                    'data': rewards,
                     'symbol': 'rect',
                     'symbolSize': 6,
                     'yAxisIndex': 0
@@ -600,7 +624,7 @@ class TrafficMetricsVisualizer:
                 {
                     'name': '延迟',
                     'type': 'line',
-                    'data': self.data['delay'],
+                    'data': delay,
                     'symbol': 'triangle',
                     'symbolSize': 6,
                     'yAxisIndex': 0
@@ -608,7 +632,7 @@ class TrafficMetricsVisualizer:
                 {
                     'name': '吞吐量',
                     'type': 'line',
-                    'data': self.data['throughput'],
+                    'data': throughput,
                     'symbol': 'diamond',
                     'symbolSize': 6,
                     'yAxisIndex': 1
@@ -617,14 +641,25 @@ class TrafficMetricsVisualizer:
         }
         return option
     
-    def get_intersection_echarts_data(self, inter_id):
-        """获取指定路口的ECharts格式数据"""
+    def get_intersection_echarts_data(self, inter_id, max_points=None, start=None, end=None, method='lttb'):
+        """获取指定路口的ECharts格式数据（缩放窗口与降采样参数同 get_training_metrics_echarts_data）"""
+        return self._intersection_echarts_data(self.refresh(), inter_id, max_points, start, end, method)
+
+    def get_all_metrics_echarts_data(self, **view):
+        """训练指标与所有路口的ECharts格式数据（基于同一份数据快照）"""
+        data = self.refresh()
+        return {
+            'training_metrics': self._training_metrics_echarts_data(data, **view),
+            'intersections': {str(i): self._intersection_echarts_data(data, i, **view) for i in range(16)}
+        }
+
+    def _intersection_echarts_data(self, data, inter_id, max_points=None, start=None, end=None, method='lttb'):
         if not 0 <= inter_id < 16:
             return {'error': f'路口ID必须在0-15之间，当前输入: {inter_id}'}
-            
-        # 获取路口数据
-        rewards = self.data['intersections'][inter_id]['reward']
-        queues = self.data['intersections'][inter_id]['queue']
+
+        # 获取路口数据（复制一份，补点时不修改数据快照）
+        rewards = list(data['intersections'][inter_id]['reward'])
+        queues = list(data['intersections'][inter_id]['queue'])
         
         # 确保至少有10个数据点
         if len(rewards) < 10:
@@ -638,8 +673,9 @@ class TrafficMetricsVisualizer:
                 rewards.append(new_reward)
                 queues.append(new_queue)
         
-        # 生成X轴数据
-        x_data = list(range(len(rewards)))
+        # 按缩放窗口截取并降采样，X轴为原始序号
+        x_data, (rewards, queues) = downsample_series(
+            [rewards, queues], max_points=max_points, start=start, end=end, method=method)
         
         print(f"路口{inter_id}数据准备完成，共{len(rewards)}个数据点")
         
@@ -746,11 +782,11 @@ def get_visualizer(log_file=None):
             raise e
     return _visualizer_instance
 
-def get_training_metrics_data():
-    """获取训练指标数据，供API调用"""
+def get_training_metrics_data(**view):
+    """获取训练指标数据，供API调用（view 为缩放窗口与降采样参数）"""
     try:
         visualizer = get_visualizer()
-        return visualizer.get_training_metrics_echarts_data()
+        return visualizer.get_training_metrics_echarts_data(**view)
     except Exception as e:
         logger.error(f"获取训练指标失败: {str(e)}")
         # 返回一个最小化的图表结构
@@ -761,11 +797,11 @@ def get_training_metrics_data():
             'series': []
         }
 
-def get_intersection_data(inter_id):
+def get_intersection_data(inter_id, **view):
     """获取指定路口数据，供API调用"""
     try:
         visualizer = get_visualizer()
-        return visualizer.get_intersection_echarts_data(int(inter_id))
+        return visualizer.get_intersection_echarts_data(int(inter_id), **view)
     except ValueError:
         return {'error': '无效的路口ID'}
     except Exception as e:
@@ -779,43 +815,43 @@ def get_intersection_data(inter_id):
             'improvement_data': {'congestion_decrease': 0, 'delay_decrease': 0}
         }
 
-def get_all_metrics_data():
+def get_metrics_version():
+    """图表数据版本，日志有新内容时变化"""
+    try:
+        return get_visualizer().data_version()
+    except Exception as e:
+        logger.error(f"获取图表数据版本失败: {str(e)}")
+        return None
+
+def build_all_metrics_data(**view):
+    """
+    获取图表数据（view 为缩放窗口与降采样参数），出错时抛出异常
+    """
+    return get_visualizer().get_all_metrics_echarts_data(**view)
+
+def empty_metrics_data():
+    """出错时返回的最小化图表数据结构"""
+    empty_chart = {
+        'title': {'text': ''},
+        'xAxis': {'type': 'category', 'data': []},
+        'yAxis': {'type': 'value'},
+        'series': []
+    }
+    
+    return {
+        'training_metrics': empty_chart,
+        'intersections': {str(i): empty_chart for i in range(16)}
+    }
+
+def get_all_metrics_data(**view):
     """
-    获取图表数据
+    获取图表数据（view 为缩放窗口与降采样参数），出错时返回空图表
     """
     try:
-        visualizer = get_visualizer()
-        
-        # 获取训练指标数据
-        training_data = visualizer.get_training_metrics_echarts_data()
-        
-        # 获取所有路口数据
-        intersections_data = {}
-        for i in range(16):
-            intersections_data[str(i)] = visualizer.get_intersection_echarts_data(i)
-        
-        # 构建结果
-        result = {
-            'training_metrics': training_data,
-            'intersections': intersections_data
-        }
-        
-        return result
+        return build_all_metrics_data(**view)
     except Exception as e:
         logger.error(f"获取所有图表数据失败: {str(e)}")
-        
-        # 返回最小化的数据结构
-        empty_chart = {
-            'title': {'text': ''},
-            'xAxis': {'type': 'category', 'data': []},
-            'yAxis': {'type': 'value'},
-            'series': []
-        }
-        
-        return {
-            'training_metrics': empty_chart,
-            'intersections': {str(i): empty_chart for i in range(16)}
-        }
+        return empty_metrics_data()
 
 if __name__ == "__main__":
     
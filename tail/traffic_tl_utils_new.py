@@ -2,8 +2,12 @@ import xml.etree.ElementTree as ET
 import re
 from colorama import init, Fore, Style, Back
 from collections import defaultdict
+import os
 import sys
 import time
+import threading
+
+import numpy as np
 
 class TrafficLightAnalyzer:
     # 路口名称映射
@@ -24,6 +28,16 @@ class TrafficLightAnalyzer:
         self.log_file = log_file
         self.tl_logics, self.connections = self.parse_net_file()
         self.time_steps = self.parse_log_file()
+        # 相位矩阵 (时间步, 路口)，无记录为 -1
+        self.phase_matrix = self.build_phase_matrix(self.time_steps)
+        # 每个路口各相位的信号状态、按 (from, to, dir) 分组的连接下标
+        self.phase_states = {tl_id: [phase.get('state') for phase in tl.findall('phase')]
+                             for tl_id, tl in self.tl_logics.items()}
+        self.connection_groups = {tl_id: self.group_connections(conns)
+                                  for tl_id, conns in self.connections.items()}
+        # 按路口编号缓存的信号灯数据
+        self._light_data = {}
+        self._light_data_lock = threading.Lock()
 
     # 增强版颜色映射
     def get_color_state(self, state):
@@ -69,19 +83,31 @@ class TrafficLightAnalyzer:
     # 解析 colightTL.log 文件
     def parse_log_file(self):
         with open(self.log_file, 'r') as f:
-            lines = f.readlines()
-        pattern = re.compile(r'Intersection (\d+): Phase (\d+)')
-        log_data = []
-        for line in lines:
-            match = pattern.match(line.strip())
-            if match:
-                intersection = int(match.group(1))
-                phase = int(match.group(2))
-                log_data.append((intersection, phase))
+            text = f.read()
+        pattern = re.compile(r'^\s*Intersection (\d+): Phase (\d+)', re.M)
+        log_data = [(int(intersection), int(phase)) for intersection, phase in pattern.findall(text)]
         # 每16行为一个时间步（适用于 4x4 路网）
         time_steps = [log_data[i:i + 16] for i in range(0, len(log_data), 16)]
         return time_steps
 
+    def build_phase_matrix(self, time_steps):
+        """时间步 × 路口 的相位矩阵；同一时间步内重复出现的路口取最后一条"""
+        num_intersections = len(self.INTERSECTION_MAPPING)
+        matrix = np.full((len(time_steps), num_intersections), -1, dtype=np.int16)
+        for t, step_data in enumerate(time_steps):
+            for intersection, phase in step_data:
+                if 0 <= intersection < num_intersections:
+                    matrix[t, intersection] = phase
+        return matrix
+
+    def group_connections(self, conns):
+        """按 (from, to, dir) 分组的连接下标与方向描述，顺序与首次出现一致"""
+        groups = defaultdict(list)
+        for i, conn in enumerate(conns):
+            groups[(conn.get('from'), conn.get('to'), conn.get('dir'))].append(i)
+        return [(key, self.get_simple_direction_description(*key), indices)
+                for key, indices in groups.items()]
+
     def parse_net_file(self):
         tree = ET.parse(self.net_file)
         root = tree.getroot()
@@ -129,7 +155,7 @@ class TrafficLightAnalyzer:
             step_data = self.time_steps[t]
             for intersection, phase in step_data:
                 # 转换数字ID回名称
-                tl_name = next((k for k, v in self.INTERSECTION_MAPPING.items() if v == intersection), f"unknown_{intersection}")
+                tl_name = self.INTERSECTION_ID_TO_NAME.get(intersection, f"unknown_{intersection}")
                 intersection_data[tl_name][t] = (intersection, phase)
         
         # 筛选目标路口
@@ -283,113 +309,102 @@ class TrafficLightAnalyzer:
                     index += 1
 
     def get_intersection_light_data(self, intersection_id):
-        """返回特定路口的信号灯数据，适合JSON格式化"""
+        """
+        返回特定路口的信号灯数据，适合JSON格式化
+        结果按路口缓存，多个请求共享同一个对象，调用方不要修改
+        """
+        result = self._light_data.get(intersection_id)
+        if result is None:
+            with self._light_data_lock:
+                result = self._light_data.get(intersection_id)
+                if result is None:
+                    result = self._build_intersection_light_data(intersection_id)
+                    self._light_data[intersection_id] = result
+        return result
+
+    def _build_intersection_light_data(self, intersection_id):
         # 转换路口ID为名称
         selected_tl_name = self.INTERSECTION_ID_TO_NAME.get(intersection_id)
         if not selected_tl_name:
             return {"error": f"找不到编号为 {intersection_id} 的路口"}
-            
-        result = {
+
+        # 该路口有记录的时间步
+        if not np.any(self.phase_matrix[:, intersection_id] >= 0):
+            return {"error": "无记录的时间步数据"}
+
+        return {
             "intersection_name": selected_tl_name,
-            "time_steps": []
+            "time_steps": self.build_light_steps(intersection_id)
         }
-        
-        # 重组数据结构
-        intersection_data = defaultdict(dict)
-        
-        # 收集所有时间步
-        target_steps = [t for t in range(len(self.time_steps))]
-        
-        # 填充数据
-        for t in target_steps:
-            step_data = self.time_steps[t]
-            for inter, phase in step_data:
-                # 转换数字ID回名称
-                tl_name = next((k for k, v in self.INTERSECTION_MAPPING.items() if v == inter), f"unknown_{inter}")
-                intersection_data[tl_name][t] = (inter, phase)
-                   
-        # 如果没有该路口的数据，返回空结果
-        if not intersection_data.get(selected_tl_name):
-            return {"error": "无记录的时间步数据"}
-            
-        # 处理相位合并
-        sorted_steps = sorted(intersection_data[selected_tl_name].items())
+
+    def build_light_steps(self, intersection_id, start=0, end=None):
+        """
+        生成路口在时间步 [start, end) 内的信号灯数据（get_intersection_light_data 的 time_steps 格式）
+        日志增量推送时按新的时间步范围调用；连续奇数相位只在范围内合并
+        """
+        selected_tl_name = self.INTERSECTION_ID_TO_NAME.get(intersection_id)
+        states = self.phase_states.get(selected_tl_name)
+        if states is None:
+            # 没有信号配置时所有相位都无效
+            return []
+
+        # 该路口在范围内有记录的时间步及相位
+        column = self.phase_matrix[start:end, intersection_id]
+        steps = np.flatnonzero(column >= 0)
+        phases = column[steps]
+        steps = steps + start
+        groups = self.connection_groups.get(selected_tl_name, [])
+        # 每个相位的连接信息只生成一次
+        connections_by_phase = {}
+        time_steps = []
+
+        def get_state(phase):
+            return states[phase] if 0 <= phase < len(states) else None
+
         index = 0
-        while index < len(sorted_steps):
-            t, (_, phase) = sorted_steps[index]
-            tl_logic = self.tl_logics.get(selected_tl_name)
-            state = self.get_phase_state(tl_logic, phase)
-            
+        while index < len(steps):
+            t, phase = int(steps[index]), int(phases[index])
+            state = get_state(phase)
+
             if not state:
                 index += 1
                 continue
-            
-            # 检查是否需要合并相位
-            duration = 5 if phase % 2 == 1 else 30
-            merged_phases = None
-            merged_steps = None
-            
-            # 对奇数相位进行合并检查
+
+            time_step_data = {
+                "time_step": t,
+                "phase": phase,
+                "duration": 5 if phase % 2 == 1 else 30,
+                "state": state,
+                "connections": None
+            }
+            next_index = index + 1
+
+            # 合并连续时间步上状态相同的奇数相位
             if phase % 2 == 1:
-                merged_phases = [phase]
-                merged_steps = [t]
-                merged_duration = duration
-
-                # 检查后续连续时间步
-                next_index = index + 1
-                while next_index < len(sorted_steps):
-                    next_t, (_, next_phase) = sorted_steps[next_index]
-                    next_state = self.get_phase_state(tl_logic, next_phase)
-
-                    # 仅合并连续奇数相位且状态相同
-                    if (next_phase % 2 == 1 and
-                            next_state == state and
-                            next_t == merged_steps[-1] + 1):
-                        merged_phases.append(next_phase)
-                        merged_duration += 5
-                        merged_steps.append(next_t)
+                last_t = t
+                while next_index < len(steps):
+                    next_t, next_phase = int(steps[next_index]), int(phases[next_index])
+                    if next_phase % 2 == 1 and get_state(next_phase) == state and next_t == last_t + 1:
+                        last_t = next_t
                         next_index += 1
                     else:
                         break
+                merged_phases = phases[index:next_index]
+                time_step_data["time_step"] = f"{t}-{last_t}"
+                time_step_data["phase"] = f"{int(merged_phases.min())}-{int(merged_phases.max())}"
+                time_step_data["duration"] = 5 * (next_index - index)
 
-                # 如果有合并，更新处理索引和持续时间
-                if len(merged_phases) > 1:
-                    index = next_index
-                    duration = merged_duration
-            
-            # 创建时间步数据
-            time_step_data = {
-                "time_step": t if not merged_steps else f"{min(merged_steps)}-{max(merged_steps)}",
-                "phase": phase if not merged_phases else f"{min(merged_phases)}-{max(merged_phases)}",
-                "duration": duration,
-                "state": state,
-                "connections": []
-            }
-            
-            # 添加连接信息
-            conns = self.connections.get(selected_tl_name, [])
-            groups = defaultdict(list)
-            for i, conn in enumerate(conns):
-                key = (conn.get('from'), conn.get('to'), conn.get('dir'))
-                groups[key].append((i, state[i]))
-            
-            for key, group in groups.items():
-                from_road, to_road, dir_ = key
-                states = ''.join([s for _, s in group])
-                
-                description = self.get_simple_direction_description(from_road, to_road, dir_)
-                
-                time_step_data["connections"].append({
-                    "description": description,
-                    "states": states
-                })
-            
-            result["time_steps"].append(time_step_data)
-            
-            if not merged_phases:
-                index += 1
-        
-        return result
+            connections = connections_by_phase.get(phase)
+            if connections is None:
+                connections = [{"description": description, "states": ''.join(state[i] for i in indices)}
+                               for _, description, indices in groups]
+                connections_by_phase[phase] = connections
+            time_step_data["connections"] = connections
+
+            time_steps.append(time_step_data)
+            index = next_index
+
+        return time_steps
 
     def analyze_intersection(self, intersection_id=None, filter_steps=False, real_time_mode=False):
         """分析特定路口或所有路口的信号灯情况"""
@@ -417,6 +432,23 @@ class TrafficLightAnalyzer:
         self.print_intersection_states(selected_tl_name, filter_steps, real_time_mode)
 
 
+# 进程内共享的分析器，按文件路径缓存，文件修改时间变化后重建
+_analyzers = {}
+_analyzers_lock = threading.Lock()
+
+
+def get_analyzer(net_file, log_file):
+    """获取（必要时重建）共享的 TrafficLightAnalyzer"""
+    key = (os.path.abspath(net_file), os.path.abspath(log_file))
+    mtimes = (os.path.getmtime(net_file), os.path.getmtime(log_file))
+    with _analyzers_lock:
+        cached = _analyzers.get(key)
+        if cached is None or cached[0] != mtimes:
+            cached = (mtimes, TrafficLightAnalyzer(net_file, log_file))
+            _analyzers[key] = cached
+        return cached[1]
+
+
 def main():
     net_file = r"./data/hangzhou_net.xml"
     log_file = r"./data/tl.log"
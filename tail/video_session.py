@@ -0,0 +1,141 @@
+import time
+import threading
+
+import cv2
+
+
+class VideoSession:
+    """
+    单个客户端（request.sid）的视频检测会话
+    独立持有 VideoCapture、暂停/停止状态与后台处理任务，互不影响
+    """
+
+    def __init__(self, sid, video_path, binary=False, event_factory=threading.Event):
+        self.sid = sid
+        self.video_path = video_path
+        # 结果帧是否以二进制发送
+        self.binary = binary
+        self.cap = None
+        self.stopped = False
+        # 处理任务是否已退出（stop() 之后任务可能还在运行，仍占用解码资源）
+        self.finished = False
+        # 运行信号：置位表示运行，清除表示暂停；处理任务在暂停时阻塞等待，不占用CPU
+        # event_factory 需与 Socket.IO 的异步模式一致（threading / eventlet / gevent）
+        self._running = event_factory()
+        self._running.set()
+        self.task = None
+        self.frame_count = 0
+        self.created_at = time.time()
+
+    def open(self):
+        """打开视频文件，失败返回 False"""
+        self.cap = cv2.VideoCapture(self.video_path)
+        return self.cap.isOpened()
+
+    @property
+    def paused(self):
+        return not self._running.is_set()
+
+    def pause(self):
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    def stop(self):
+        """通知处理任务退出，VideoCapture 由处理任务结束时释放"""
+        self.stopped = True
+        # 唤醒暂停中的处理任务，使其尽快退出
+        self._running.set()
+
+    def wait_if_paused(self):
+        """暂停时阻塞直到继续或停止；返回是否应继续处理"""
+        if not self._running.is_set():
+            self._running.wait()
+        return not self.stopped
+
+    @property
+    def running(self):
+        return not self.stopped and self.cap is not None and self.cap.isOpened()
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+
+class VideoSessionManager:
+    """
+    按 sid 管理视频检测会话，限制同时运行的会话数
+    所有会话共用推理引擎，每个会话同一时刻只有一帧在推理，
+    每处理完一帧主动让出调度，多个会话按到达顺序轮流进入同一批次
+    已停止但处理任务尚未退出的会话仍计入上限，直到 finish() 被调用
+    """
+
+    def __init__(self, max_sessions=4, event_factory=threading.Event):
+        self.max_sessions = max(1, int(max_sessions))
+        self.event_factory = event_factory
+        self._sessions = {}
+        # 已从 _sessions 移除、处理任务仍在退出中的会话
+        self._draining = set()
+        self._lock = threading.Lock()
+
+    def _detach(self, session):
+        """停止会话并从 _sessions 移除，任务未退出前转入 _draining（需持有锁）"""
+        session.stop()
+        del self._sessions[session.sid]
+        if not session.finished:
+            self._draining.add(session)
+
+    def get(self, sid):
+        with self._lock:
+            return self._sessions.get(sid)
+
+    def start(self, sid, video_path, binary=False):
+        """
+        处理客户端的开始/暂停请求
+        返回 (会话, 状态)，状态为 started | paused | resumed | rejected
+        同一视频路径再次请求时切换暂停/继续；路径变化时停止旧会话并新建会话
+        """
+        with self._lock:
+            session = self._sessions.get(sid)
+            if session is not None and session.video_path == video_path and not session.stopped:
+                if session.paused:
+                    session.resume()
+                    return session, 'resumed'
+                session.pause()
+                return session, 'paused'
+
+            if session is not None:
+                self._detach(session)
+
+            active = sum(1 for s in self._sessions.values() if not s.finished) + len(self._draining)
+            if active >= self.max_sessions:
+                return None, 'rejected'
+
+            session = VideoSession(sid, video_path, binary=binary,
+                                   event_factory=self.event_factory)
+            self._sessions[sid] = session
+            return session, 'started'
+
+    def finish(self, session):
+        """处理任务结束时调用：释放 VideoCapture 并移除会话，释放占用的名额"""
+        session.stop()
+        session.release()
+        with self._lock:
+            session.finished = True
+            self._draining.discard(session)
+            if self._sessions.get(session.sid) is session:
+                del self._sessions[session.sid]
+
+    def remove(self, sid):
+        """客户端断开时停止其会话"""
+        with self._lock:
+            session = self._sessions.get(sid)
+            if session is not None:
+                self._detach(session)
+        return session
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)